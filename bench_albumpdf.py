@@ -0,0 +1,123 @@
+"""Compare ways of turning a photo album into a PDF: time and peak RSS.
+
+Usage: python bench_albumpdf.py [--count 50] [--size 4000x3000] [--dir DIR]
+
+Builds the same album three ways, each in a fresh process so peak RSS is
+its own:
+  fpdf         the old path: decode, re-encode to a temp JPEG, FPDF
+  reencode     PDFWriter, with every photo decoded and re-encoded
+  passthrough  PDFWriter, with JPEGs embedded as they are
+Without --dir, COUNT copies of a generated noisy JPEG are used.
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from PIL import Image
+from pdfengine import PDFWriter, jpeg_info, transcode_to_jpeg
+
+MODES = ("fpdf", "reencode", "passthrough")
+
+
+def build_fpdf(paths: list, workdir: str) -> int:
+    from fpdf import FPDF
+    pdf = FPDF()
+    for index, path in enumerate(paths):
+        image = Image.open(path)
+        if image.mode in ('RGBA', 'P'):
+            image = image.convert('RGB')
+        temp_jpg = os.path.join(workdir, f"page_{index}.jpg")
+        image.save(temp_jpg, 'JPEG')
+        pdf.add_page()
+        pdf.image(temp_jpg, x=10, y=10, w=pdf.w - 20)
+    output = os.path.join(workdir, "output.pdf")
+    pdf.output(output)
+    return os.path.getsize(output)
+
+
+def build_writer(paths: list, passthrough: bool) -> int:
+    writer = PDFWriter()
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        info = jpeg_info(data) if passthrough else None
+        if info is None:
+            data = transcode_to_jpeg(data)
+            info = jpeg_info(data)
+        writer.add_jpeg(data, info)
+    return len(writer.finish())
+
+
+def run_mode(mode: str, paths: list) -> dict:
+    start = time.perf_counter()
+    if mode == "fpdf":
+        with tempfile.TemporaryDirectory(prefix="bench-pdf") as workdir:
+            size = build_fpdf(paths, workdir)
+    else:
+        size = build_writer(paths, passthrough=mode == "passthrough")
+    return {
+        "seconds": time.perf_counter() - start,
+        "size": size,
+        # Kilobytes on Linux
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    }
+
+
+def make_album(directory: str, count: int, size: tuple) -> list:
+    output = io.BytesIO()
+    Image.effect_noise(size, 40).convert("RGB").save(output, "JPEG", quality=90)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"photo_{index:03d}.jpg")
+        with open(path, "wb") as f:
+            f.write(output.getvalue())
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--size", default="4000x3000")
+    parser.add_argument("--dir", help="use the JPEGs in this directory instead")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child process: build one PDF and report
+        print(json.dumps(run_mode(args.mode, args.paths)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="bench-album") as album:
+        if args.dir:
+            paths = sorted(
+                os.path.join(args.dir, name) for name in os.listdir(args.dir)
+                if name.lower().endswith((".jpg", ".jpeg"))
+            )
+        else:
+            width, height = (int(v) for v in args.size.split("x"))
+            paths = make_album(album, args.count, (width, height))
+        source = sum(os.path.getsize(path) for path in paths)
+        print(f"{len(paths)} photos, {source / 1024 ** 2:.1f}MB")
+
+        for mode in MODES:
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--mode", mode, *paths],
+                capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                print(f"{mode:>12}: failed: {result.stderr.strip().splitlines()[-1]}")
+                continue
+            r = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{mode:>12}: {r['seconds']:6.2f}s, peak RSS {r['peak_rss'] / 1024 ** 2:7.1f}MB, "
+                  f"PDF {r['size'] / 1024 ** 2:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
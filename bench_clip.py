@@ -0,0 +1,66 @@
+"""Compare a section download against a full download for one video.
+
+Usage: python bench_clip.py URL START END
+
+START and END are in seconds. Both downloads use the MP4 button's
+format selection and go to throwaway temp directories. The script prints
+wall time, bytes fetched (as reported by yt-dlp) and the size of the
+resulting file for each.
+"""
+import argparse
+import os
+import tempfile
+import time
+import yt_dlp
+from mediajobs import clip_options
+
+# Same selection as the bot's "Download MP4" button
+MP4_FORMAT = 'bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4] / bv*+ba/b'
+
+
+def measure(url: str, extra: dict) -> dict:
+    fetched = {}
+
+    def hook(progress):
+        if progress.get('status') == 'finished':
+            fetched[progress.get('filename')] = progress.get('downloaded_bytes') or progress.get('total_bytes') or 0
+
+    with tempfile.TemporaryDirectory(prefix="bench-clip") as tmp:
+        options = {
+            'format': MP4_FORMAT,
+            'outtmpl': os.path.join(tmp, '%(id)s.%(ext)s'),
+            'merge_output_format': 'mp4',
+            'quiet': True,
+            'progress_hooks': [hook],
+            **extra
+        }
+        start = time.perf_counter()
+        with yt_dlp.YoutubeDL(options) as ydl:
+            ydl.download([url])
+        elapsed = time.perf_counter() - start
+        output = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+    return {"seconds": elapsed, "fetched": sum(fetched.values()), "output": output}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("start", type=int)
+    parser.add_argument("end", type=int)
+    args = parser.parse_args()
+
+    results = {
+        "section": measure(args.url, clip_options(args.start, args.end)),
+        "full": measure(args.url, {})
+    }
+    for name, r in results.items():
+        print(f"{name:>8}: {r['seconds']:7.1f}s, {r['fetched'] / 1024 ** 2:8.1f}MB fetched, "
+              f"{r['output'] / 1024 ** 2:8.1f}MB output")
+    section, full = results["section"], results["full"]
+    if section['seconds'] and full['fetched']:
+        print(f"section is {full['seconds'] / section['seconds']:.1f}x faster "
+              f"and fetches {section['fetched'] / full['fetched']:.0%} of the bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Measure /imageconvert throughput with many conversions at once.
+
+Usage: python bench_imageconvert.py [--count 20] [--format webp] [--image FILE]
+
+Runs COUNT concurrent conversions twice: once the old way, with Pillow on
+the event loop, and once through imageengine's worker processes. Without
+--image a noisy 3MP PNG is generated. For each run the script prints wall
+time, conversions per second, and the event loop's worst stall, which is
+how long every other command would have waited.
+"""
+import argparse
+import asyncio
+import io
+import time
+from PIL import Image
+import imageengine
+
+STALL_PROBE = 0.01  # seconds
+
+
+def convert_inline(data: bytes, target_format: str) -> bytes:
+    """The conversion as the bot used to run it, before imageengine"""
+    image = Image.open(io.BytesIO(data))
+    output = io.BytesIO()
+    if target_format == 'jpg':
+        if image.mode in ('RGBA', 'P'):
+            image = image.convert('RGB')
+    image.save(output, format=imageengine.FORMATS[target_format])
+    return output.getvalue()
+
+
+async def measure(convert, data: bytes, target_format: str, count: int) -> dict:
+    stalls = []
+
+    async def probe():
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(STALL_PROBE)
+            stalls.append(time.perf_counter() - start - STALL_PROBE)
+
+    prober = asyncio.create_task(probe())
+    # Let the prober take its first sample before the work starts
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(convert(data, target_format) for _ in range(count)))
+    elapsed = time.perf_counter() - start
+    prober.cancel()
+    return {"seconds": elapsed, "rate": count / elapsed, "stall": max(stalls, default=elapsed)}
+
+
+async def inline(data: bytes, target_format: str):
+    return convert_inline(data, target_format)
+
+
+async def pooled(data: bytes, target_format: str):
+    return await imageengine.convert(data, target_format)
+
+
+def sample_image() -> bytes:
+    output = io.BytesIO()
+    Image.effect_noise((2000, 1500), 60).convert("RGB").save(output, "PNG")
+    return output.getvalue()
+
+
+async def run(args):
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = sample_image()
+    # Start the workers outside the timed run
+    await pooled(data, args.format)
+
+    results = {
+        "inline": await measure(inline, data, args.format, args.count),
+        "pool": await measure(pooled, data, args.format, args.count)
+    }
+    print(f"{args.count} concurrent conversions to {args.format}, {imageengine.IMAGE_WORKERS} workers")
+    for name, r in results.items():
+        print(f"{name:>8}: {r['seconds']:6.2f}s, {r['rate']:5.2f}/s, worst loop stall {r['stall'] * 1000:7.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--format", default="webp", choices=sorted(imageengine.FORMATS))
+    parser.add_argument("--image", help="convert this file instead of a generated photo")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    finally:
+        imageengine.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare TriggerMatcher with the old per-trigger loop as triggers grow.
+
+Usage: python bench_triggers.py [--counts 10,100,1000,5000] [--messages 500]
+
+For each trigger count, random trigger names (a few of them "@" mention
+triggers) are matched against the same random messages, once with the
+loop on_message used to run and once with TriggerMatcher. The script
+prints the matcher's build time and the average time per message for
+both, and checks that they picked the same trigger every time.
+"""
+import argparse
+import random
+import string
+import time
+from triggers import TriggerMatcher
+
+MESSAGE_WORDS = 20
+MENTION_SHARE = 0.05
+
+
+def old_match(triggers: list, content: str, mention_names: list):
+    """The matching loop from on_message before TriggerMatcher"""
+    cleaned_message = content.lower()
+    for trigger in triggers:
+        trigger_name = trigger['name'].lower()
+        if trigger_name.startswith('@'):
+            mention_part = trigger_name[1:]
+            if any(mention_part.lower() in name.lower() for name in mention_names):
+                return trigger
+            elif mention_part.lower() in cleaned_message:
+                return trigger
+        elif (
+            trigger_name == cleaned_message or
+            trigger_name in cleaned_message.split() or
+            trigger_name in cleaned_message
+        ):
+            return trigger
+    return None
+
+
+def word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+
+
+def make_triggers(rng: random.Random, count: int) -> list:
+    return [
+        {"name": ("@" if rng.random() < MENTION_SHARE else "") + word(rng), "response": str(index)}
+        for index in range(count)
+    ]
+
+
+def make_messages(rng: random.Random, triggers: list, count: int) -> list:
+    messages = []
+    for _ in range(count):
+        words = [word(rng) for _ in range(MESSAGE_WORDS)]
+        # About half the messages contain a real trigger somewhere
+        if triggers and rng.random() < 0.5:
+            words[rng.randrange(len(words))] = rng.choice(triggers)['name'].lstrip('@')
+        mentions = [word(rng) for _ in range(rng.randint(0, 2))]
+        messages.append((" ".join(words), mentions))
+    return messages
+
+
+def per_message(func, messages: list) -> tuple:
+    start = time.perf_counter()
+    results = [func(content, mentions) for content, mentions in messages]
+    return (time.perf_counter() - start) / len(messages), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--counts", default="10,100,1000,5000")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"{'triggers':>8} {'build':>9} {'old loop':>10} {'matcher':>10} {'speedup':>8}")
+    for count in (int(c) for c in args.counts.split(",")):
+        triggers = make_triggers(rng, count)
+        messages = make_messages(rng, triggers, args.messages)
+
+        start = time.perf_counter()
+        matcher = TriggerMatcher(triggers)
+        build = time.perf_counter() - start
+
+        old_time, old_results = per_message(lambda c, m: old_match(triggers, c, m), messages)
+        new_time, new_results = per_message(matcher.match, messages)
+        if old_results != new_results:
+            raise SystemExit(f"Matcher disagrees with the old loop at {count} triggers")
+        print(f"{count:>8} {build * 1000:7.1f}ms {old_time * 1000:8.3f}ms {new_time * 1000:8.3f}ms "
+              f"{old_time / new_time:7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
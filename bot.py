@@ -8,7 +8,6 @@ from config import TOKEN, OWNER_ID, BOT_PREFIX, HENRIK_API_KEY
 from settings import Settings
 import asyncio
 import logging
-import requests
 from typing import List, Dict, Optional, Literal
 from discord.ui import Button, View
 from database import (
@@ -19,7 +18,6 @@ from database import (
     save_bot_prefix,
     get_bot_prefix,
     save_allowed_users,
-    get_allowed_users,
     add_allowed_user,
     remove_allowed_user,
     save_note,
@@ -33,17 +31,38 @@ from database import (
     add_to_blacklist,
     remove_from_blacklist,
     is_blacklisted,
-    get_blacklist
+    get_blacklist,
+    get_trigger_cache_stats,
+    get_trigger_matcher,
+    load_auth_index,
+    is_authorized,
+    get_allowed_user_ids,
+    add_mc_watch,
+    remove_mc_watch,
+    get_mc_watches
 )
 import aiohttp
+from httpclient import HTTPClient
+from henrik import HenrikClient, HenrikAPIError
+from valostats import MatchStore
+from mcstatus import MinecraftStatus
+from mcwatch import MinecraftWatcher
+from mediajobs import MediaJobExecutor, JobCancelled, ytdl_download, clip_options
+from mediacache import MediaCache, media_key
+from transcode import fit_to_size, TELEGRAM_UPLOAD_LIMIT
+from workspace import WorkspaceManager, QuotaExceeded
+from pdfengine import AlbumPDF
+import docx
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from imageengine import convert as convert_image, fit as fit_image, shutdown_pool, ImageTooLarge, ConvertBatch, FORMATS as IMAGE_FORMATS
 import google.generativeai as genai
 import io
 import random
 from memes import MEME_TEMPLATES, get_random_templates
 from urllib.parse import quote
-import yt_dlp
-import telegram
 from telegram.error import TelegramError
+from telegramupload import TelegramUploader, UploadQueueFull
 from flask import Flask
 from threading import Thread
 
@@ -58,12 +77,6 @@ intents.presences = True  # Add this for status/activity info
 
 settings = Settings()
 
-# Add these constants near the top of the file
-HENRIK_API_BASE = "https://api.henrikdev.xyz/valorant"
-HEADERS = {
-    "Authorization": HENRIK_API_KEY
-} if HENRIK_API_KEY != "your_henrik_api_key_here" else {}
-
 # Add this constant with the regions
 VALORANT_REGIONS = ['eu', 'na', 'ap', 'kr', 'latam', 'br']
 
@@ -121,28 +134,68 @@ MOVIE_SITES = parse_movie_sites()
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
 
+# Encode settings that are part of the media cache key; change these
+# whenever the output they produce changes
+MP4_PROFILE = "x264-2pass-fit-telegram"
+MP3_PROFILE = "mp3-192k"
+# Assumed download size when yt-dlp doesn't report one, for disk admission
+DOWNLOAD_SIZE_ESTIMATE = 500 * 1024 * 1024
+# Upload limit outside servers (DMs); servers report their own
+DISCORD_FILE_LIMIT = 10 * 1024 * 1024
+# Hosts listed in /status, and how much of each hostname is shown
+STATUS_HTTP_HOSTS = 5
+STATUS_HOST_LENGTH = 40
+
+class PrivateCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Global permission check run before every slash command"""
+        if is_authorized(interaction.user.id):
+            return True
+        await unauthorized_message(interaction)
+        return False
+
 class PrivateBot(commands.Bot):
     def __init__(self):
         super().__init__(
             command_prefix=settings.get("prefix"),
             intents=intents,
-            application_id=1355108574245814393
+            application_id=1355108574245814393,
+            tree_cls=PrivateCommandTree
         )
         self.gemini_sessions = {}
+        # Shared outbound HTTP client; its session is opened in setup_hook
+        self.http_client = HTTPClient()
+        self.henrik = HenrikClient(self.http_client, HENRIK_API_KEY)
+        self.match_store = MatchStore()
+        self.mc_status = MinecraftStatus(self.http_client)
+        self.mc_watcher = MinecraftWatcher(self.mc_status, self.send_watch_alert)
+        self.media_jobs = MediaJobExecutor()
+        self.media_cache = MediaCache()
+        self.telegram_uploader = TelegramUploader(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+        self.workspaces = WorkspaceManager()
 
     async def setup_hook(self):
+        await self.http_client.start()
+        await self.telegram_uploader.start()
+        stale = await asyncio.to_thread(self.workspaces.cleanup_stale)
+        if stale:
+            print(f"Removed {stale} job workspaces left over from the last run")
+        
         print("Loading settings from Supabase...")
         try:
             # Load settings from Supabase
             prefix = await get_bot_prefix()
-            allowed_users = await get_allowed_users()
+            await load_auth_index()
             
             # Update local settings
             settings.set("prefix", prefix)
-            settings.set("allowed_users", allowed_users)
+            settings.set("allowed_users", sorted(get_allowed_user_ids()))
             
             print("Settings loaded successfully!")
             
+            # One scheduler task polls every watched Minecraft server
+            self.mc_watcher.start(await get_mc_watches())
+            
             # Register commands
             print("Setting up commands...")
             try:
@@ -154,6 +207,28 @@ class PrivateBot(commands.Bot):
         except Exception as e:
             print(f"Error in setup: {e}")
 
+    async def send_watch_alert(self, watch: dict, changes: list, status: dict):
+        channel = self.get_channel(int(watch['channel_id']))
+        if channel is None:
+            return
+        address = f"{watch['ip']}:{watch['port']}" if watch.get('port') else watch['ip']
+        embed = discord.Embed(
+            title="🎮 Minecraft Server Update",
+            description=f"**{address}**\n" + "\n".join(f"• {change}" for change in changes),
+            color=int(settings.get("embed_color"), 16)
+        )
+        embed.set_footer(text=f"Watch #{watch['id']} • /mcunwatch to stop")
+        await channel.send(embed=embed)
+
+    async def close(self):
+        await self.mc_watcher.stop()
+        self.media_jobs.shutdown()
+        shutdown_pool()
+        await self.telegram_uploader.close()
+        await self.http_client.close()
+        self.match_store.close()
+        await super().close()
+
 # Create the bot instance before using it
 bot = PrivateBot()
 
@@ -169,7 +244,7 @@ async def on_guild_join(guild: discord.Guild):
     # Scan for authorized users
     auth_users = []
     for member in guild.members:
-        if member.id in settings.get("allowed_users"):
+        if is_authorized(member.id):
             auth_users.append(member.mention)
 
     # Create a single, clean embed
@@ -215,7 +290,7 @@ async def on_guild_join(guild: discord.Guild):
         # If no auth users, wait and then leave
         if not auth_users:
             await asyncio.sleep(300)  # Wait 5 minutes
-            if not any(member.id in settings.get("allowed_users") for member in guild.members):
+            if not any(is_authorized(member.id) for member in guild.members):
                 await guild.leave()
 
 # Then add the commands
@@ -224,9 +299,6 @@ async def on_guild_join(guild: discord.Guild):
     description="Get a greeting from the bot"
 )
 async def hello(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
     await interaction.response.send_message(f"Hello {interaction.user.name}! How can I help you today?")
 
 @bot.tree.command(
@@ -234,20 +306,37 @@ async def hello(interaction: discord.Interaction):
     description="Check bot status and latency"
 )
 async def status(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-    await interaction.response.send_message(f"Bot is running normally\nLatency: {round(bot.latency * 1000)}ms")
+    trigger_cache = get_trigger_cache_stats()
+    media_cache = bot.media_cache.stats()
+    uploads = bot.telegram_uploader.stats()
+    workspaces = bot.workspaces.stats()
+    # Busiest hosts only, so the message stays under Discord's 2000 characters
+    http_stats = sorted(bot.http_client.stats().items(), key=lambda item: item[1]['requests'], reverse=True)
+    http_lines = [
+        f"• {host[:STATUS_HOST_LENGTH]}: {m['requests']} requests, avg {m['avg_ms']:.0f}ms, "
+        f"max {m['max_ms']:.0f}ms, {m['errors']} errors"
+        for host, m in http_stats[:STATUS_HTTP_HOSTS]
+    ]
+    if len(http_stats) > STATUS_HTTP_HOSTS:
+        http_lines.append(f"• ...and {len(http_stats) - STATUS_HTTP_HOSTS} more hosts")
+    await interaction.response.send_message(
+        f"Bot is running normally\nLatency: {round(bot.latency * 1000)}ms\n"
+        f"Trigger cache: {trigger_cache['hits']} hits / {trigger_cache['misses']} misses "
+        f"({trigger_cache['hit_rate']:.0%}), {trigger_cache['size']} guilds cached\n"
+        f"Media cache: {media_cache['entries']} files, {media_cache['bytes'] / 1024 ** 2:.0f}MB, "
+        f"{media_cache['hits']} hits / {media_cache['misses']} misses\n"
+        f"Telegram uploads: {uploads['uploads']} done, {uploads['failures']} failed, {uploads['retries']} retries, "
+        f"{uploads['queued']} queued, avg {uploads['avg_seconds']:.1f}s, {uploads['mb_per_second']:.1f}MB/s\n"
+        f"Job workspaces: {workspaces['active']} active, "
+        f"{workspaces['reserved'] / 1024 ** 2:.0f}/{workspaces['quota'] / 1024 ** 2:.0f}MB reserved"
+        + ("\nHTTP:\n" + "\n".join(http_lines) if http_lines else "")
+    )
 
 @bot.tree.command(
     name="note",
     description="Save a private note"
 )
 async def note(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-    
     modal = NoteModal()
     await interaction.response.send_modal(modal)
 
@@ -277,10 +366,6 @@ class NoteModal(discord.ui.Modal, title="Create Note"):
     description="View all saved notes"
 )
 async def viewnotes(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     class NotesView(discord.ui.View):
         def __init__(self):
             super().__init__(timeout=300)
@@ -428,7 +513,7 @@ async def settings_menu(interaction: discord.Interaction):
     embed.add_field(name="Current Settings", value=
         f"**Prefix:** {settings.get('prefix')}\n"
         f"**Status:** {settings.get('status_message')}\n"
-        f"**Allowed Users:** {', '.join([f'<@{uid}>' for uid in settings.get('allowed_users')])}\n"
+        f"**Allowed Users:** {', '.join([f'<@{uid}>' for uid in get_allowed_user_ids()])}\n"
         f"**Embed Color:** {settings.get('embed_color')}"
     )
 
@@ -486,6 +571,8 @@ class MatchView(View):
         super().__init__(timeout=180)  # 3 minutes timeout
         self.matches = matches
         self.current_index = current_index
+        # Build every page up front so Previous/Next only swap embeds
+        self.embeds = [self.create_match_embed(match, index) for index, match in enumerate(matches)]
         self.update_buttons()
 
     def update_buttons(self):
@@ -495,7 +582,7 @@ class MatchView(View):
         if self.current_index < len(self.matches) - 1:
             self.add_item(Button(label="Next ▶️", custom_id="next", style=discord.ButtonStyle.blurple))
 
-    async def create_match_embed(self, match: Dict) -> discord.Embed:
+    def create_match_embed(self, match: Dict, index: int) -> discord.Embed:
         meta = match.get('metadata', {})
         teams = match.get('teams', {})
         player_stats = match.get('player_stats', {})
@@ -505,7 +592,7 @@ class MatchView(View):
         map_image = f"https://media.valorant-api.com/maps/{map_name.lower()}/splash.png"
         
         embed = discord.Embed(
-            title=f"Match {self.current_index + 1}/5: {map_name}",
+            title=f"Match {index + 1}/{len(self.matches)}: {map_name}",
             description=f"**Mode:** {meta.get('mode')}\n─────────────",  # Divider line
             color=int(settings.get("embed_color"), 16)
         )
@@ -594,7 +681,7 @@ class MatchView(View):
         
         self.update_buttons()
         await interaction.response.edit_message(
-            embed=await self.create_match_embed(self.matches[self.current_index]), 
+            embed=self.embeds[self.current_index], 
             view=self
         )
         return True
@@ -614,26 +701,14 @@ class ValorantIDModal(discord.ui.Modal, title="Enter Valorant ID"):
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)  # Make it ephemeral
         try:
-            # Get account data
-            account_response = requests.get(
-                f"{HENRIK_API_BASE}/v1/account/{self.player_name.value}/{self.player_tag.value}",
-                headers=HEADERS
-            )
-            account_data = account_response.json()
-            
-            if account_response.status_code != 200:
+            # Account first (for the region), then MMR and the latest
+            # competitive match concurrently; all three are cached
+            try:
+                account, mmr, matches = await bot.henrik.get_profile(self.player_name.value, self.player_tag.value)
+            except HenrikAPIError:
                 await interaction.followup.send(f"Error: Could not find player {self.player_name.value}#{self.player_tag.value}")
                 return
             
-            player_region = account_data.get('data', {}).get('region', 'eu').lower()
-            
-            # Get MMR data
-            mmr_response = requests.get(
-                f"{HENRIK_API_BASE}/v2/mmr/{player_region}/{self.player_name.value}/{self.player_tag.value}",
-                headers=HEADERS
-            )
-            mmr_data = mmr_response.json()
-            
             # Create profile embed
             profile_embed = discord.Embed(
                 title=f"Valorant Profile: {self.player_name.value}#{self.player_tag.value}",
@@ -641,30 +716,22 @@ class ValorantIDModal(discord.ui.Modal, title="Enter Valorant ID"):
             )
             
             # Add account info
-            account = account_data.get('data', {})
             card_url = account.get('card', {}).get('small')
             if card_url:
                 profile_embed.set_thumbnail(url=card_url)
             
             # Get current rank from latest competitive match
             current_rank = "Unknown"
-            matches_response = requests.get(
-                f"{HENRIK_API_BASE}/v3/matches/{player_region}/{self.player_name.value}/{self.player_tag.value}?size=1&mode=competitive",
-                headers=HEADERS
-            )
-            if matches_response.status_code == 200:
-                matches_data = matches_response.json()
-                if matches_data.get('data'):
-                    match = matches_data['data'][0]
-                    for player in match.get('players', {}).get('all_players', []):
-                        if player.get('name').lower() == self.player_name.value.lower() and player.get('tag').lower() == self.player_tag.value.lower():
-                            current_rank = player.get('currenttier_patched', 'Unknown')
-                            break
+            if matches:
+                match = matches[0]
+                for player in match.get('players', {}).get('all_players', []):
+                    if player.get('name').lower() == self.player_name.value.lower() and player.get('tag').lower() == self.player_tag.value.lower():
+                        current_rank = player.get('currenttier_patched', 'Unknown')
+                        break
             
             # Add rank info
             peak_rank = "Unknown"
-            if mmr_data.get('data'):
-                mmr = mmr_data['data']
+            if mmr:
                 peak_rank = mmr.get('highest_rank', {}).get('patched_tier', 'Unknown')
             
             profile_embed.add_field(
@@ -693,6 +760,17 @@ class MatchDetailsButton(discord.ui.View):
         self.name = name
         self.tag = tag
         self.matches_shown = False
+        # Start loading match details now so the button answers instantly
+        self.match_view_task = self.prefetch_matches()
+
+    def prefetch_matches(self) -> asyncio.Task:
+        task = asyncio.create_task(load_match_view(self.name, self.tag))
+        # Mark failures as retrieved; show_matches retries them on click
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def on_timeout(self):
+        self.match_view_task.cancel()
 
     @discord.ui.button(label="Show Match Details", style=discord.ButtonStyle.blurple, emoji="🎮")
     async def show_matches(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -702,54 +780,101 @@ class MatchDetailsButton(discord.ui.View):
         
         await interaction.response.defer(ephemeral=True)
         try:
-            await show_match_details(interaction, self.name, self.tag)
+            # Retry if the background prefetch failed or was cancelled
+            if self.match_view_task.done() and (self.match_view_task.cancelled() or self.match_view_task.exception()):
+                self.match_view_task = self.prefetch_matches()
+            
+            try:
+                match_view = await self.match_view_task
+            except HenrikAPIError:
+                await interaction.followup.send("Could not fetch player data.", ephemeral=True)
+                return
+            
+            if match_view is None:
+                await interaction.followup.send("No recent matches found.", ephemeral=True)
+                return
+            
+            await interaction.followup.send(embed=match_view.embeds[0], view=match_view, ephemeral=True)
             self.matches_shown = True
         except Exception as e:
             print(f"Error showing match details: {str(e)}")
             await interaction.followup.send("Failed to load match details. Please try again.", ephemeral=True)
 
-async def show_match_details(interaction: discord.Interaction, name: str, tag: str):
-    try:
-        # First get account data to get region
-        account_response = requests.get(
-            f"{HENRIK_API_BASE}/v1/account/{name}/{tag}",
-            headers=HEADERS
-        )
-        if account_response.status_code != 200:
-            await interaction.followup.send("Could not fetch player data.")
-            return
+    @discord.ui.button(label="Career Stats", style=discord.ButtonStyle.gray, emoji="📈")
+    async def career_stats(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer(ephemeral=True)
+        try:
+            account = await bot.henrik.get_account(self.name, self.tag)
+            # Only matches we haven't stored yet are pulled from the API
+            await bot.match_store.sync(bot.henrik, account, self.name, self.tag)
+            stats = await bot.match_store.career_stats(account['puuid'])
             
-        account_data = account_response.json()
-        player_region = account_data.get('data', {}).get('region', 'eu').lower()
-        
-        # Get match history
-        matches_response = requests.get(
-            f"{HENRIK_API_BASE}/v3/matches/{player_region}/{name}/{tag}?size=5",
-            headers=HEADERS
-        )
-        matches_data = matches_response.json()
-        
-        if not matches_data.get('data'):
-            await interaction.followup.send("No recent matches found.", ephemeral=True)
-            return
-        
-        # Process matches
-        processed_matches = []
-        for match in matches_data['data'][:5]:
-            for player in match.get('players', {}).get('all_players', []):
-                if player.get('name').lower() == name.lower() and player.get('tag').lower() == tag.lower():
-                    match['player_stats'] = player
-                    break
-            processed_matches.append(match)
-        
-        # Create match view with first match
-        match_view = MatchView(processed_matches)
-        first_embed = await match_view.create_match_embed(processed_matches[0])
-        await interaction.followup.send(embed=first_embed, view=match_view, ephemeral=True)  # Make it ephemeral
-        
-    except Exception as e:
-        print(f"Error fetching match details: {str(e)}")
-        await interaction.followup.send("An error occurred while fetching match details. Please try again later.", ephemeral=True)
+            if not stats['matches']:
+                await interaction.followup.send("No stored matches found for this player yet.", ephemeral=True)
+                return
+            
+            await interaction.followup.send(embed=create_career_embed(self.name, self.tag, stats), ephemeral=True)
+        except Exception as e:
+            print(f"Error showing career stats: {str(e)}")
+            await interaction.followup.send("Failed to load career stats. Please try again.", ephemeral=True)
+
+def create_career_embed(name: str, tag: str, stats: Dict) -> discord.Embed:
+    embed = discord.Embed(
+        title=f"Career Stats: {name}#{tag}",
+        description=f"Across **{stats['matches']}** stored matches",
+        color=int(settings.get("embed_color"), 16)
+    )
+    
+    rolling_kd = stats['rolling_kd']
+    trend = ""
+    if len(rolling_kd) > 1:
+        trend = " 📈" if rolling_kd[-1] >= rolling_kd[0] else " 📉"
+    
+    embed.add_field(
+        name="Overall",
+        value=f"🏆 **Win Rate:** {stats['win_rate']:.1f}% ({stats['wins']}W / {stats['losses']}L)\n"
+              f"🎯 **K/D:** {stats['kd']:.2f}\n"
+              f"🎯 **HS%:** {stats['hs']:.1f}%\n"
+              f"📊 **ACS:** {stats['acs']:.0f}\n"
+              f"🔁 **K/D (last {stats['rolling_window']}):** {rolling_kd[-1]:.2f}{trend}",
+        inline=False
+    )
+    
+    def group_lines(groups):
+        # No win rate for groups played only in team-less modes
+        return "\n".join(
+            f"**{g['name']}** ({g['matches']}) - K/D {g['kd']:.2f} | HS {g['hs']:.0f}% | ACS {g['acs']:.0f}"
+            + (f" | WR {g['win_rate']:.0f}%" if g['decided'] else "")
+            for g in groups[:5]
+        ) or "No data"
+    
+    embed.add_field(name="🕵️ Top Agents", value=group_lines(stats['agents']), inline=False)
+    embed.add_field(name="🗺️ Maps", value=group_lines(stats['maps']), inline=False)
+    embed.set_footer(text="Stats are built from stored match history")
+    return embed
+
+async def load_match_view(name: str, tag: str) -> Optional[MatchView]:
+    """Fetch recent matches and build their view, or None if there are none"""
+    # Account data (for the region) is usually still cached from the profile lookup
+    account = await bot.henrik.get_account(name, tag)
+    player_region = account.get('region', 'eu').lower()
+    
+    # Get match history
+    matches = await bot.henrik.get_matches(player_region, name, tag, size=5)
+    if not matches:
+        return None
+    
+    # Process matches (copies, so the cached API response stays untouched)
+    processed_matches = []
+    for match in matches[:5]:
+        match = dict(match)
+        for player in match.get('players', {}).get('all_players', []):
+            if player.get('name').lower() == name.lower() and player.get('tag').lower() == tag.lower():
+                match['player_stats'] = player
+                break
+        processed_matches.append(match)
+    
+    return MatchView(processed_matches)
 
 async def unauthorized_message(interaction: discord.Interaction):
     embed = discord.Embed(
@@ -780,10 +905,6 @@ async def unauthorized_message(interaction: discord.Interaction):
     description="Get Valorant player information"
 )
 async def valoinfo(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-    
     modal = ValorantIDModal()
     await interaction.response.send_modal(modal)
 
@@ -879,13 +1000,12 @@ class MinecraftServerModal(discord.ui.Modal, title="Enter Minecraft Server Detai
         try:
             ip = self.server_ip.value.strip()
             port = self.server_port.value.strip() if self.server_port.value else None
-            address = f"{ip}:{port}" if port else ip
             
-            async with aiohttp.ClientSession() as session:
-                java_response = await session.get(f"https://api.mcsrvstat.us/3/{address}")
-                java_data = await java_response.json()
-                bedrock_response = await session.get(f"https://api.mcsrvstat.us/bedrock/3/{address}")
-                bedrock_data = await bedrock_response.json()
+            # Both editions are pinged directly and concurrently, falling back
+            # to mcsrvstat.us; repeat lookups within a minute hit the cache
+            status = await bot.mc_status.lookup(ip, port)
+            java_data = status['java']
+            bedrock_data = status['bedrock']
             
             # Create main embed
             embed = discord.Embed(
@@ -985,9 +1105,17 @@ class MinecraftServerModal(discord.ui.Modal, title="Enter Minecraft Server Detai
                 inline=False
             )
             
-            # Add footer with cache info
+            # Add footer with cache/latency info
+            checked_at = datetime.fromtimestamp(status['checked_at']).strftime('%H:%M:%S')
+            if status['source'] == "cache":
+                answered = "Served from cache"
+            else:
+                answered = (
+                    f"Java {status['latency']['java']:.0f}ms ({status['path']['java']}) • "
+                    f"Bedrock {status['latency']['bedrock']:.0f}ms ({status['path']['bedrock']})"
+                )
             embed.set_footer(
-                text=f"Data cached for 1 minute • Last checked: {datetime.now().strftime('%H:%M:%S')}"
+                text=f"{answered} • Data cached for 1 minute • Last checked: {checked_at}"
             )
             
             await interaction.followup.send(embed=embed, ephemeral=True)
@@ -1004,13 +1132,73 @@ class MinecraftServerModal(discord.ui.Modal, title="Enter Minecraft Server Detai
     description="Check Minecraft server status (Java & Bedrock)"
 )
 async def mcserverstatus(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-    
     modal = MinecraftServerModal()
     await interaction.response.send_modal(modal)
 
+@bot.tree.command(
+    name="mcwatch",
+    description="Watch a Minecraft server and get alerts in this channel when it changes"
+)
+@app_commands.describe(
+    ip="Server address",
+    port="Server port (leave empty for auto-detection)",
+    player_threshold="Also alert when the player count crosses this number"
+)
+async def mcwatch(interaction: discord.Interaction, ip: str, port: Optional[int] = None, player_threshold: Optional[int] = None):
+    await interaction.response.defer(ephemeral=True)
+    watch = await add_mc_watch(interaction.channel_id, ip.strip(), port, player_threshold, interaction.user.id)
+    if not watch:
+        await interaction.followup.send("❌ Failed to add the server to the watchlist.", ephemeral=True)
+        return
+    bot.mc_watcher.add(watch)
+    await interaction.followup.send(
+        f"✅ Watching `{ip}` (watch #{watch['id']}). Changes will be posted in this channel.",
+        ephemeral=True
+    )
+
+@bot.tree.command(
+    name="mcunwatch",
+    description="Stop watching a Minecraft server"
+)
+@app_commands.describe(watch_id="Watch number from /mcwatchlist")
+async def mcunwatch(interaction: discord.Interaction, watch_id: int):
+    await interaction.response.defer(ephemeral=True)
+    if await remove_mc_watch(watch_id, interaction.channel_id):
+        bot.mc_watcher.remove(watch_id)
+        await interaction.followup.send(f"✅ Stopped watching #{watch_id}.", ephemeral=True)
+    else:
+        await interaction.followup.send(f"❌ No watch #{watch_id} in this channel.", ephemeral=True)
+
+@bot.tree.command(
+    name="mcwatchlist",
+    description="List the Minecraft servers watched in this channel"
+)
+async def mcwatchlist(interaction: discord.Interaction):
+    watches = [w for w in bot.mc_watcher.watches.values() if int(w['channel_id']) == interaction.channel_id]
+    if not watches:
+        await interaction.response.send_message("No servers are watched in this channel.", ephemeral=True)
+        return
+
+    lines = []
+    for watch in sorted(watches, key=lambda w: w['id']):
+        address = f"{watch['ip']}:{watch['port']}" if watch.get('port') else watch['ip']
+        last = bot.mc_watcher.last.get(watch['id'])
+        if last is None:
+            state = "⏳ Not checked yet"
+        elif last['java_online'] or last['bedrock_online']:
+            state = f"🟢 {last['players']} players"
+        else:
+            state = "🔴 Offline"
+        threshold = f" • alert at {watch['player_threshold']} players" if watch.get('player_threshold') is not None else ""
+        lines.append(f"**#{watch['id']}** `{address}` — {state}{threshold}")
+
+    embed = discord.Embed(
+        title="👀 Minecraft Watchlist",
+        description="\n".join(lines),
+        color=int(settings.get("embed_color"), 16)
+    )
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 class GeminiChatView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)  # No timeout for chat session
@@ -1021,10 +1209,6 @@ class GeminiChatView(discord.ui.View):
     description="Start a chat session with Gemini AI"
 )
 async def geminichat(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-    
     # Get API key from Supabase
     api_key = await get_gemini_key()
     if not api_key:
@@ -1067,10 +1251,6 @@ async def geminichat(interaction: discord.Interaction):
     description="End current Gemini chat session"
 )
 async def geminichatend(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-        
     if interaction.channel.id not in bot.gemini_sessions:
         await interaction.response.send_message("No active chat session found!", ephemeral=True)
         return
@@ -1148,60 +1328,32 @@ async def on_message(message):
     await bot.process_commands(message)
     
     try:
-        # Get server-specific triggers
-        triggers = await get_triggers(message.guild.id if message.guild else 0)
+        # Get the compiled matcher for this server's triggers
+        matcher = await get_trigger_matcher(message.guild.id if message.guild else 0)
         
-        # Get the raw message content (shows <@id> instead of resolved mentions)
-        raw_message = message.content
-        
-        # Get the cleaned message content (with resolved mentions)
-        cleaned_message = message.clean_content.lower()
+        # One pass over the cleaned content (with resolved mentions) finds
+        # the first matching trigger, mention triggers included
+        trigger = matcher.match(
+            message.clean_content,
+            [member.name for member in message.mentions]
+        )
         
-        # Check each trigger
-        for trigger in triggers:
-            trigger_name = trigger['name'].lower()
-            
-            # Handle different types of triggers
-            is_triggered = False
-            
-            if trigger_name.startswith('@'):
-                # This is a mention trigger
-                mention_part = trigger_name[1:]  # Remove @ symbol
-                
-                # Check if this is in the raw message (handles actual mentions)
-                if any(mention_part.lower() in member.name.lower() 
-                      for member in message.mentions):
-                    is_triggered = True
-                    
-                # Also check the cleaned content (handles text that looks like mentions)
-                elif mention_part.lower() in cleaned_message:
-                    is_triggered = True
-                    
-            else:
-                # Regular trigger matching
-                is_triggered = (
-                    trigger_name == cleaned_message or  # Exact match
-                    trigger_name in cleaned_message.split() or  # Word match
-                    trigger_name in cleaned_message  # Substring match
-                )
-            
-            if is_triggered:
-                # Add a small delay to seem more natural
+        if trigger:
+            # Add a small delay to seem more natural
+            await asyncio.sleep(0.5)
+            async with message.channel.typing():
                 await asyncio.sleep(0.5)
-                async with message.channel.typing():
-                    await asyncio.sleep(0.5)
-                    
-                # Format response
-                response = trigger['response']
-                # Replace {user} with message author's mention
-                response = response.replace("{user}", message.author.mention)
-                # Replace {channel} with channel mention
-                response = response.replace("{channel}", message.channel.mention)
-                # Replace {server} with server name
-                response = response.replace("{server}", message.guild.name if message.guild else "DM")
                 
-                await message.channel.send(response)
-                break  # Stop after first matching trigger
+            # Format response
+            response = trigger['response']
+            # Replace {user} with message author's mention
+            response = response.replace("{user}", message.author.mention)
+            # Replace {channel} with channel mention
+            response = response.replace("{channel}", message.channel.mention)
+            # Replace {server} with server name
+            response = response.replace("{server}", message.guild.name if message.guild else "DM")
+            
+            await message.channel.send(response)
                 
     except Exception as e:
         print(f"Error checking triggers: {e}")
@@ -1219,9 +1371,7 @@ class AddUserModal(discord.ui.Modal, title="Add User"):
             user_id = int(self.user_id.value)
             if await add_allowed_user(user_id):
                 # Update local settings too
-                allowed_users = settings.get("allowed_users")
-                allowed_users.append(user_id)
-                settings.set("allowed_users", allowed_users)
+                settings.set("allowed_users", sorted(get_allowed_user_ids()))
                 await interaction.followup.send(f"Added user <@{user_id}> to allowed users.", ephemeral=True)
             else:
                 await interaction.followup.send("User already in allowed list.", ephemeral=True)
@@ -1241,9 +1391,7 @@ class RemoveUserModal(discord.ui.Modal, title="Remove User"):
             user_id = int(self.user_id.value)
             if await remove_allowed_user(user_id):
                 # Update local settings too
-                allowed_users = settings.get("allowed_users")
-                allowed_users.remove(user_id)
-                settings.set("allowed_users", allowed_users)
+                settings.set("allowed_users", sorted(get_allowed_user_ids()))
                 await interaction.followup.send(f"Removed user <@{user_id}> from allowed users.", ephemeral=True)
             else:
                 await interaction.followup.send("Cannot remove owner or user not in allowed list.", ephemeral=True)
@@ -1727,10 +1875,6 @@ class EditModalView(discord.ui.View):
     description="Create a new auto-responder trigger"
 )
 async def triggercreate(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-    
     modal = TriggerCreateModal()
     await interaction.response.send_modal(modal)
 
@@ -1739,10 +1883,6 @@ async def triggercreate(interaction: discord.Interaction):
     description="Show list of auto-responder triggers"
 )
 async def triggerlist(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-    
     view = TriggerListView(guild_id=interaction.guild_id)
     await view.load_page()
     await interaction.response.send_message(embed=view.get_embed(), view=view, ephemeral=True)
@@ -1766,12 +1906,20 @@ class ImageFormatModal(discord.ui.Modal, title="Select Format"):
             max_length=10,
             style=discord.TextStyle.short
         )
+        self.max_size = discord.ui.TextInput(
+            label="Max size in MB (optional)",
+            placeholder="e.g. 2 - shrinks the image to fit",
+            required=False,
+            max_length=6,
+            style=discord.TextStyle.short
+        )
         self.add_item(self.format)
+        self.add_item(self.max_size)
 
     async def on_submit(self, interaction: discord.Interaction):
         # Validate format first
         target_format = self.format.value.lower()
-        supported_formats = ['png', 'jpg', 'jpeg', 'webp', 'gif', 'bmp', 'ico']
+        supported_formats = list(IMAGE_FORMATS)
         
         if target_format not in supported_formats:
             await interaction.response.send_message(
@@ -1780,17 +1928,29 @@ class ImageFormatModal(discord.ui.Modal, title="Select Format"):
             )
             return
 
+        max_bytes = None
+        if self.max_size.value.strip():
+            try:
+                max_bytes = int(float(self.max_size.value) * 1024 * 1024)
+            except (ValueError, OverflowError):
+                max_bytes = 0
+            if max_bytes <= 0:
+                await interaction.response.send_message("❌ Max size must be a number of MB, like 2 or 0.5.", ephemeral=True)
+                return
+
         # If format is valid, show upload options
         await interaction.response.send_message(
             "Choose how to upload your image:",
-            view=ImageUploadMethodView(target_format),
+            view=ImageUploadMethodView(target_format, max_bytes),
             ephemeral=True
         )
 
 class ImageUploadMethodView(discord.ui.View):
-    def __init__(self, target_format):
+    def __init__(self, target_format, max_bytes=None):
         super().__init__(timeout=300)
         self.target_format = target_format
+        # Shrink the result to fit this many bytes, if set
+        self.max_bytes = max_bytes
 
     @discord.ui.button(label="Upload File", style=discord.ButtonStyle.primary, emoji="📁")
     async def file_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -1812,7 +1972,129 @@ class ImageUploadMethodView(discord.ui.View):
 
     @discord.ui.button(label="Upload by URL", style=discord.ButtonStyle.secondary, emoji="🔗")
     async def url_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_modal(ImageURLModal(self.target_format))
+        await interaction.response.send_modal(ImageURLModal(self.target_format, self.max_bytes))
+
+    @discord.ui.button(label="Batch Upload", style=discord.ButtonStyle.secondary, emoji="📦")
+    async def batch_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # Images are converted while the user keeps uploading and come
+        # back together as one ZIP
+        limit = interaction.guild.filesize_limit if interaction.guild else DISCORD_FILE_LIMIT
+        batch = ConvertBatch(self.target_format, limit, self.max_bytes)
+        await interaction.response.send_message(
+            "Upload your images now, as many messages as you like.\n"
+            "Type `done` when you've finished uploading, or `cancel` to abort.",
+            ephemeral=True
+        )
+
+        def check(m):
+            return (m.author.id == interaction.user.id and
+                   m.channel.id == interaction.channel.id and
+                   (m.attachments or m.content.lower() in ['done', 'cancel']))
+
+        try:
+            while True:
+                try:
+                    message = await interaction.client.wait_for('message', timeout=300.0, check=check)
+                except asyncio.TimeoutError:
+                    await interaction.followup.send("Timed out. Please try again.", ephemeral=True)
+                    return
+
+                if message.content.lower() == 'cancel':
+                    await interaction.followup.send("Operation cancelled.", ephemeral=True)
+                    return
+
+                if message.content.lower() == 'done':
+                    if not batch.added:
+                        await interaction.followup.send("No images were uploaded. Please try again.", ephemeral=True)
+                        return
+                    await self.send_batch(interaction, batch)
+                    return
+
+                added = []
+                for attachment in message.attachments:
+                    if not (attachment.content_type or '').startswith('image/'):
+                        await interaction.followup.send(f"❌ Skipped {attachment.filename}: Not an image file.", ephemeral=True)
+                    elif not batch.add(attachment.filename, attachment.read):
+                        await interaction.followup.send(
+                            f"❌ Skipped {attachment.filename}: the ZIP is already at Discord's upload limit.\n"
+                            "Type `done` to get it.",
+                            ephemeral=True
+                        )
+                    else:
+                        added.append(attachment.filename)
+                if added:
+                    await interaction.followup.send(
+                        f"✅ Added {len(added)} image(s). Total: {batch.added}\n"
+                        "Keep uploading or type `done` when finished.",
+                        ephemeral=True
+                    )
+        finally:
+            # Stops conversions still running if the user cancelled or went quiet
+            batch.close()
+
+    async def send_batch(self, interaction, batch):
+        try:
+            await interaction.followup.send("⏳ Finishing your conversions...", ephemeral=True)
+            zip_data = await batch.finish()
+            if zip_data is None:
+                await interaction.followup.send("❌ None of the images could be converted.", ephemeral=True)
+                return
+            if len(zip_data) > batch.limit_bytes:
+                await interaction.followup.send(
+                    f"❌ The ZIP is over Discord's {batch.limit_bytes / 1024 ** 2:.0f}MB upload limit. "
+                    "Try fewer images or set a max size.",
+                    ephemeral=True
+                )
+                return
+
+            message = f"✅ Converted {batch.converted} images to {self.target_format.upper()}!"
+            if batch.skipped:
+                message += f"\nSkipped: {', '.join(batch.skipped)}"
+            await interaction.followup.send(
+                message,
+                file=discord.File(io.BytesIO(zip_data), f"converted_{self.target_format}.zip"),
+                ephemeral=True
+            )
+        except Exception as e:
+            print(f"Error sending batch: {e}")
+            await interaction.followup.send(
+                "❌ An error occurred while converting the images. Please try again.",
+                ephemeral=True
+            )
+
+    async def send_converted(self, interaction, image_data):
+        # Decoding and encoding happen in the image worker processes
+        limit = interaction.guild.filesize_limit if interaction.guild else DISCORD_FILE_LIMIT
+        detail = None
+        try:
+            if self.max_bytes:
+                output, detail = await fit_image(image_data, self.target_format, min(self.max_bytes, limit))
+            else:
+                output = await convert_image(image_data, self.target_format)
+        except ImageTooLarge as e:
+            await interaction.followup.send(f"❌ That image is too large to convert ({e}).", ephemeral=True)
+            return
+
+        size = output.getbuffer().nbytes
+        if size > limit:
+            hint = "" if self.max_bytes else " Try again with a max size."
+            await interaction.followup.send(
+                f"❌ The converted image is over Discord's {limit / 1024 ** 2:.0f}MB upload limit.{hint}",
+                ephemeral=True
+            )
+            return
+        if self.max_bytes and size > self.max_bytes:
+            detail = ", ".join(filter(None, [detail, f"couldn't get under {self.max_bytes / 1024 ** 2:g}MB"]))
+
+        message = f"✅ Here's your converted image in {self.target_format.upper()} format:"
+        if detail:
+            message = f"✅ Here's your converted image in {self.target_format.upper()} format ({detail}, {size / 1024:.0f}KB):"
+        # Send converted image
+        await interaction.followup.send(
+            message,
+            file=discord.File(output, f"converted.{self.target_format}"),
+            ephemeral=True
+        )
 
     async def process_image(self, interaction, attachment):
         try:
@@ -1820,24 +2102,7 @@ class ImageUploadMethodView(discord.ui.View):
             
             # Download image
             image_data = await attachment.read()
-            
-            # Process and convert
-            image = Image.open(io.BytesIO(image_data))
-            output = io.BytesIO()
-            
-            if self.target_format == 'jpg':
-                if image.mode in ('RGBA', 'P'):
-                    image = image.convert('RGB')
-            
-            image.save(output, format=self.target_format.upper())
-            output.seek(0)
-
-            # Send converted image
-            await interaction.followup.send(
-                f"✅ Here's your converted image in {self.target_format.upper()} format:",
-                file=discord.File(output, f"converted.{self.target_format}"),
-                ephemeral=True
-            )
+            await self.send_converted(interaction, image_data)
 
         except Exception as e:
             print(f"Error processing image: {e}")
@@ -1851,30 +2116,13 @@ class ImageUploadMethodView(discord.ui.View):
             await interaction.followup.send("⏳ Processing your image...", ephemeral=True)
             
             # Download from URL
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        await interaction.followup.send("❌ Failed to download image from URL.", ephemeral=True)
-                        return
-                    image_data = await response.read()
-
-            # Process and convert
-            image = Image.open(io.BytesIO(image_data))
-            output = io.BytesIO()
-            
-            if self.target_format == 'jpg':
-                if image.mode in ('RGBA', 'P'):
-                    image = image.convert('RGB')
-            
-            image.save(output, format=self.target_format.upper())
-            output.seek(0)
+            async with bot.http_client.get(url) as response:
+                if response.status != 200:
+                    await interaction.followup.send("❌ Failed to download image from URL.", ephemeral=True)
+                    return
+                image_data = await response.read()
 
-            # Send converted image
-            await interaction.followup.send(
-                f"✅ Here's your converted image in {self.target_format.upper()} format:",
-                file=discord.File(output, f"converted.{self.target_format}"),
-                ephemeral=True
-            )
+            await self.send_converted(interaction, image_data)
 
         except Exception as e:
             print(f"Error processing URL: {e}")
@@ -1884,9 +2132,10 @@ class ImageUploadMethodView(discord.ui.View):
             )
 
 class ImageURLModal(discord.ui.Modal, title="Image URL"):
-    def __init__(self, target_format):
+    def __init__(self, target_format, max_bytes=None):
         super().__init__()
         self.target_format = target_format
+        self.max_bytes = max_bytes
         self.url = discord.ui.TextInput(
             label="Image URL",
             placeholder="Enter the direct URL to your image",
@@ -1897,7 +2146,7 @@ class ImageURLModal(discord.ui.Modal, title="Image URL"):
 
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        view = ImageUploadMethodView(self.target_format)
+        view = ImageUploadMethodView(self.target_format, self.max_bytes)
         await view.process_url(interaction, self.url.value)
 
 @bot.tree.command(
@@ -1905,10 +2154,6 @@ class ImageURLModal(discord.ui.Modal, title="Image URL"):
     description="Convert images between different formats (PNG, JPG, WEBP, GIF, etc.)"
 )
 async def imageconvert(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     embed = discord.Embed(
         title="🖼️ Image Converter",
         description=(
@@ -1924,7 +2169,8 @@ async def imageconvert(interaction: discord.Interaction):
             "1. Upload your image\n"
             "2. Click the button below\n"
             "3. Enter desired format\n"
-            "4. Get your converted image!"
+            "4. Get your converted image!\n\n"
+            "Use **Batch Upload** to convert many images at once into a ZIP."
         ),
         color=int(settings.get("embed_color"), 16)
     )
@@ -2006,131 +2252,104 @@ if os.environ.get("IS_RENDER"):
 class ImagesToPDFView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=600)  # 10 minute timeout
-        self.images = []
+        self.album = None
         self.waiting_for_images = False
 
     @discord.ui.button(label="Upload Images", style=discord.ButtonStyle.primary, emoji="📸")
     async def upload_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         self.waiting_for_images = True
+        # Pages are downloaded and written into the PDF while the user is
+        # still uploading, so "done" only has to wait for the last few
+        limit = interaction.guild.filesize_limit if interaction.guild else DISCORD_FILE_LIMIT
+        self.album = AlbumPDF(limit)
         await interaction.response.send_message(
             "Please upload your images now. You can upload multiple images.\n"
             "Type `done` when you've finished uploading, or `cancel` to abort.",
             ephemeral=True
         )
         
-        while self.waiting_for_images:
-            def check(m):
-                return (m.author.id == interaction.user.id and 
-                       m.channel.id == interaction.channel.id and
-                       (m.attachments or m.content.lower() in ['done', 'cancel']))
-            
-            try:
-                message = await interaction.client.wait_for('message', timeout=300.0, check=check)
+        try:
+            while self.waiting_for_images:
+                def check(m):
+                    return (m.author.id == interaction.user.id and 
+                           m.channel.id == interaction.channel.id and
+                           (m.attachments or m.content.lower() in ['done', 'cancel']))
                 
-                if message.content.lower() == 'done':
-                    if not self.images:
-                        await interaction.followup.send("No images were uploaded. Please try again.", ephemeral=True)
+                try:
+                    message = await interaction.client.wait_for('message', timeout=300.0, check=check)
+                    
+                    if message.content.lower() == 'done':
+                        if not self.album.added:
+                            await interaction.followup.send("No images were uploaded. Please try again.", ephemeral=True)
+                            self.waiting_for_images = False
+                            return
+                        await self.create_pdf(interaction)
                         self.waiting_for_images = False
                         return
-                    await self.create_pdf(interaction)
-                    self.waiting_for_images = False
-                    return
-                
-                elif message.content.lower() == 'cancel':
-                    await interaction.followup.send("Operation cancelled.", ephemeral=True)
+                    
+                    elif message.content.lower() == 'cancel':
+                        await interaction.followup.send("Operation cancelled.", ephemeral=True)
+                        self.waiting_for_images = False
+                        return
+                    
+                    elif message.attachments:
+                        for attachment in message.attachments:
+                            if (attachment.content_type or '').startswith('image/'):
+                                if not self.album.add(attachment.filename, attachment.read):
+                                    await interaction.followup.send(
+                                        f"❌ Skipped {attachment.filename}: the PDF is already at Discord's upload limit.\n"
+                                        "Type `done` to get it.",
+                                        ephemeral=True
+                                    )
+                                    continue
+                                await interaction.followup.send(
+                                    f"✅ Added image: {attachment.filename}\n"
+                                    f"Total images: {self.album.added}\n"
+                                    "Keep uploading or type `done` when finished.",
+                                    ephemeral=True
+                                )
+                            else:
+                                await interaction.followup.send(
+                                    f"❌ Skipped {attachment.filename}: Not an image file.",
+                                    ephemeral=True
+                                )
+                    
+                except asyncio.TimeoutError:
+                    await interaction.followup.send("Timed out. Please try again.", ephemeral=True)
                     self.waiting_for_images = False
                     return
-                
-                elif message.attachments:
-                    for attachment in message.attachments:
-                        if attachment.content_type.startswith('image/'):
-                            self.images.append(attachment)
-                            await interaction.followup.send(
-                                f"✅ Added image: {attachment.filename}\n"
-                                f"Total images: {len(self.images)}\n"
-                                "Keep uploading or type `done` when finished.",
-                                ephemeral=True
-                            )
-                        else:
-                            await interaction.followup.send(
-                                f"❌ Skipped {attachment.filename}: Not an image file.",
-                                ephemeral=True
-                            )
-                
-            except asyncio.TimeoutError:
-                await interaction.followup.send("Timed out. Please try again.", ephemeral=True)
-                self.waiting_for_images = False
-                return
+        finally:
+            # Stops background downloads if the user cancelled or went quiet
+            self.album.close()
 
     async def create_pdf(self, interaction):
         try:
             await interaction.followup.send("⏳ Creating PDF...", ephemeral=True)
             
-            # Create a PDF
-            pdf = FPDF()
-            temp_files = []  # Keep track of temp files
-            
-            for attachment in self.images:
-                try:
-                    # Download image
-                    image_data = await attachment.read()
-                    image = Image.open(io.BytesIO(image_data))
-                    
-                    # Convert to RGB if necessary
-                    if image.mode in ('RGBA', 'P'):
-                        image = image.convert('RGB')
-                    
-                    # Save as temporary JPG with unique name
-                    temp_jpg = f'temp_{len(temp_files)}_{attachment.filename}.jpg'
-                    temp_files.append(temp_jpg)
-                    image.save(temp_jpg, 'JPEG')
-                    
-                    # Add to PDF
-                    pdf.add_page()
-                    
-                    # Get image dimensions
-                    img_width, img_height = image.size
-                    aspect = img_height / img_width
-                    
-                    # Calculate dimensions to fit page
-                    pdf_width = pdf.w - 20  # margins
-                    pdf_height = pdf_width * aspect
-                    
-                    # Add image to page
-                    pdf.image(temp_jpg, x=10, y=10, w=pdf_width)
-                    
-                except Exception as e:
-                    print(f"Error processing image {attachment.filename}: {e}")
-                    continue
-            
-            # Save PDF to temporary file
-            temp_pdf = 'temp_output.pdf'
-            pdf.output(temp_pdf)
+            pdf_data = await self.album.finish()
+            if pdf_data is None:
+                await interaction.followup.send("❌ None of the images could be read.", ephemeral=True)
+                return
             
-            # Read the PDF and send it
-            with open(temp_pdf, 'rb') as f:
-                pdf_data = f.read()
+            if len(pdf_data) > self.album.limit_bytes:
                 await interaction.followup.send(
-                    f"✅ Created PDF with {len(self.images)} images!",
-                    file=discord.File(io.BytesIO(pdf_data), "combined_images.pdf"),
+                    f"❌ The PDF is over Discord's "
+                    f"{self.album.limit_bytes / 1024 ** 2:.0f}MB upload limit. Try fewer images.",
                     ephemeral=True
                 )
+                return
             
-            # Clean up all temporary files
-            for temp_file in temp_files:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            if os.path.exists(temp_pdf):
-                os.remove(temp_pdf)
+            message = f"✅ Created PDF with {len(self.album.writer.pages)} images!"
+            if self.album.skipped:
+                message += f"\nSkipped: {', '.join(self.album.skipped)}"
+            await interaction.followup.send(
+                message,
+                file=discord.File(io.BytesIO(pdf_data), "combined_images.pdf"),
+                ephemeral=True
+            )
             
         except Exception as e:
             print(f"Error creating PDF: {e}")
-            # Clean up any remaining temp files
-            for temp_file in temp_files:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            if os.path.exists(temp_pdf):
-                os.remove(temp_pdf)
             await interaction.followup.send(
                 "❌ An error occurred while creating the PDF. Please try again.",
                 ephemeral=True
@@ -2141,10 +2360,6 @@ class ImagesToPDFView(discord.ui.View):
     description="Combine multiple images into a single PDF file"
 )
 async def imagestopdf(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     embed = discord.Embed(
         title="📸 Images to PDF Converter",
         description=(
@@ -2174,6 +2389,61 @@ async def imagestopdf(interaction: discord.Interaction):
         ephemeral=True
     )
 
+def docx_to_pdf(docx_data: bytes, temp_docx: str, temp_pdf: str) -> bytes:
+    """Render a DOCX's paragraphs as a plain PDF (blocking; run it in a thread)"""
+    # Save DOCX into this job's workspace
+    with open(temp_docx, 'wb') as f:
+        f.write(docx_data)
+
+    # Open the Word document
+    doc = docx.Document(temp_docx)
+
+    # Create PDF
+    c = canvas.Canvas(temp_pdf, pagesize=letter)
+    width, height = letter
+
+    # Convert each paragraph
+    y = height - 40  # Start from top with margin
+    for para in doc.paragraphs:
+        if y < 40:  # Bottom margin
+            c.showPage()
+            y = height - 40
+
+        # Add text
+        text = para.text
+        if text.strip():  # Only process non-empty paragraphs
+            # Handle different paragraph styles
+            if para.style.name.startswith('Heading'):
+                c.setFont("Helvetica-Bold", 14)
+            else:
+                c.setFont("Helvetica", 12)
+
+            # Word wrap and write text
+            words = text.split()
+            line = []
+            for word in words:
+                line.append(word)
+                line_text = ' '.join(line)
+                if c.stringWidth(line_text, "Helvetica", 12) > width - 80:
+                    # Write line and move down
+                    c.drawString(40, y, ' '.join(line[:-1]))
+                    y -= 20
+                    line = [word]
+
+            if line:  # Write remaining text
+                c.drawString(40, y, ' '.join(line))
+                y -= 20
+
+        # Add extra space between paragraphs
+        y -= 10
+
+    c.save()
+
+    # Read the PDF
+    with open(temp_pdf, 'rb') as f:
+        pdf_data = f.read()
+    return pdf_data
+
 # Add after ImagesToPDFView class
 class DocConvertView(discord.ui.View):
     def __init__(self):
@@ -2214,76 +2484,26 @@ class DocConvertView(discord.ui.View):
             
             # Download the DOCX file
             docx_data = await attachment.read()
-            temp_docx = 'temp_document.docx'
-            temp_pdf = 'temp_document.pdf'
-            
-            # Save DOCX temporarily
-            with open(temp_docx, 'wb') as f:
-                f.write(docx_data)
             
-            try:
-                # Open the Word document
-                doc = docx.Document(temp_docx)
-                
-                # Create PDF
-                c = canvas.Canvas(temp_pdf, pagesize=letter)
-                width, height = letter
+            async with bot.workspaces.workspace("docx", len(docx_data) * 4) as workspace:
+                temp_docx = workspace.file("document.docx")
+                temp_pdf = workspace.file("document.pdf")
                 
-                # Convert each paragraph
-                y = height - 40  # Start from top with margin
-                for para in doc.paragraphs:
-                    if y < 40:  # Bottom margin
-                        c.showPage()
-                        y = height - 40
-                    
-                    # Add text
-                    text = para.text
-                    if text.strip():  # Only process non-empty paragraphs
-                        # Handle different paragraph styles
-                        if para.style.name.startswith('Heading'):
-                            c.setFont("Helvetica-Bold", 14)
-                        else:
-                            c.setFont("Helvetica", 12)
-                        
-                        # Word wrap and write text
-                        words = text.split()
-                        line = []
-                        for word in words:
-                            line.append(word)
-                            line_text = ' '.join(line)
-                            if c.stringWidth(line_text, "Helvetica", 12) > width - 80:
-                                # Write line and move down
-                                c.drawString(40, y, ' '.join(line[:-1]))
-                                y -= 20
-                                line = [word]
-                        
-                        if line:  # Write remaining text
-                            c.drawString(40, y, ' '.join(line))
-                            y -= 20
-                    
-                    # Add extra space between paragraphs
-                    y -= 10
+                # python-docx and reportlab are blocking; keep them off the event loop
+                pdf_data = await asyncio.to_thread(docx_to_pdf, docx_data, temp_docx, temp_pdf)
                 
-                c.save()
-                
-                # Read the PDF
-                with open(temp_pdf, 'rb') as f:
-                    pdf_data = f.read()
-                
-                # Send the converted PDF
-                await interaction.followup.send(
-                    "✅ Here's your converted PDF file:",
-                    file=discord.File(io.BytesIO(pdf_data), "converted.pdf"),
-                    ephemeral=True
-                )
-                
-            finally:
-                # Clean up temp files
-                if os.path.exists(temp_docx):
-                    os.remove(temp_docx)
-                if os.path.exists(temp_pdf):
-                    os.remove(temp_pdf)
+            # Send the converted PDF
+            await interaction.followup.send(
+                "✅ Here's your converted PDF file:",
+                file=discord.File(io.BytesIO(pdf_data), "converted.pdf"),
+                ephemeral=True
+            )
             
+        except QuotaExceeded:
+            await interaction.followup.send(
+                "⏳ The server is busy with other jobs. Please try again in a few minutes.",
+                ephemeral=True
+            )
         except Exception as e:
             print(f"Error converting document: {e}")
             await interaction.followup.send(
@@ -2296,10 +2516,6 @@ class DocConvertView(discord.ui.View):
     description="Convert DOCX documents to PDF"
 )
 async def docconvert(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     embed = discord.Embed(
         title="📄 Document Converter",
         description=(
@@ -2423,10 +2639,10 @@ class BlacklistAddModal(discord.ui.Modal, title="Add User to Blacklist"):
 
             if await add_to_blacklist(user_id, self.reason.value):
                 # Remove from allowed users if present
-                allowed_users = settings.get("allowed_users")
-                if user_id in allowed_users:
-                    allowed_users.remove(user_id)
+                if user_id in get_allowed_user_ids():
+                    allowed_users = sorted(get_allowed_user_ids() - {user_id})
                     await save_allowed_users(allowed_users)
+                    settings.set("allowed_users", allowed_users)
                 
                 user_obj = await bot.fetch_user(user_id)
                 embed = discord.Embed(
@@ -2571,77 +2787,77 @@ class ImagineModal(discord.ui.Modal, title="Generate Image"):
                 ],
             }
             
-            async with aiohttp.ClientSession() as session:
-                await interaction.followup.send("🎨 Generating your images... Please wait!", ephemeral=True)
+            await interaction.followup.send("🎨 Generating your images... Please wait!", ephemeral=True)
+            
+            # Generation can take well over the default request timeout
+            async with bot.http_client.post(url, headers=headers, json=body, timeout=aiohttp.ClientTimeout(total=120)) as response:
+                if response.status != 200:
+                    error_data = await response.json()
+                    print(f"API Error: {error_data}")
+                    await interaction.followup.send(
+                        "❌ Failed to generate images. Please try again.",
+                        ephemeral=True
+                    )
+                    return
                 
-                async with session.post(url, headers=headers, json=body) as response:
-                    if response.status != 200:
-                        error_data = await response.json()
-                        print(f"API Error: {error_data}")
-                        await interaction.followup.send(
-                            "❌ Failed to generate images. Please try again.",
-                            ephemeral=True
-                        )
-                        return
-                    
-                    data = await response.json()
-                    
-                    # Create a temporary message to store images
-                    temp_message = await interaction.channel.send("🎨 Processing images...")
-                    
-                    # Process and upload images
-                    images = []
-                    files = []
-                    for i, image in enumerate(data["artifacts"]):
-                        try:
-                            # Convert base64 to file
-                            image_data = base64.b64decode(image["base64"])
-                            file = discord.File(
-                                io.BytesIO(image_data), 
-                                f"image_{i}.png",
-                                description=self.prompt.value
-                            )
-                            files.append(file)
-                        except Exception as e:
-                            print(f"Error processing image {i}: {e}")
-                            continue
-                    
-                    # Upload all images in one message
-                    if files:
-                        msg = await temp_message.edit(content="", attachments=files)
-                        images = [{
-                            'src': attachment.url,
-                            'prompt': self.prompt.value
-                        } for attachment in msg.attachments]
-                    
-                    # Clean up temp message if no images
-                    if not images:
-                        await temp_message.delete()
-                        await interaction.followup.send(
-                            "❌ Failed to process images. Please try again.",
-                            ephemeral=True
+                data = await response.json()
+                
+                # Create a temporary message to store images
+                temp_message = await interaction.channel.send("🎨 Processing images...")
+                
+                # Process and upload images
+                images = []
+                files = []
+                for i, image in enumerate(data["artifacts"]):
+                    try:
+                        # Convert base64 to file
+                        image_data = base64.b64decode(image["base64"])
+                        file = discord.File(
+                            io.BytesIO(image_data), 
+                            f"image_{i}.png",
+                            description=self.prompt.value
                         )
-                        return
-                    
-                    # Create embed with results
-                    embed = discord.Embed(
-                        title="🎨 Generated Images",
-                        description=f"**Your Prompt:** {self.prompt.value}",
-                        color=discord.Color.blue()
-                    )
-                    
-                    # Set first image and create view
-                    embed.set_image(url=images[0]['src'])
-                    embed.set_footer(text=f"Image 1/{len(images)} • Use buttons to navigate")
-                    
-                    # Send result and delete temp message
+                        files.append(file)
+                    except Exception as e:
+                        print(f"Error processing image {i}: {e}")
+                        continue
+                
+                # Upload all images in one message
+                if files:
+                    msg = await temp_message.edit(content="", attachments=files)
+                    images = [{
+                        'src': attachment.url,
+                        'prompt': self.prompt.value
+                    } for attachment in msg.attachments]
+                
+                # Clean up temp message if no images
+                if not images:
+                    await temp_message.delete()
                     await interaction.followup.send(
-                        embed=embed,
-                        view=ImageResultView(images),
+                        "❌ Failed to process images. Please try again.",
                         ephemeral=True
                     )
-                    await temp_message.delete()
-                    
+                    return
+                
+                # Create embed with results
+                embed = discord.Embed(
+                    title="🎨 Generated Images",
+                    description=f"**Your Prompt:** {self.prompt.value}",
+                    color=discord.Color.blue()
+                )
+                
+                # Set first image and create view
+                embed.set_image(url=images[0]['src'])
+                embed.set_footer(text=f"Image 1/{len(images)} • Use buttons to navigate")
+                
+                # Send result and delete temp message
+                await interaction.followup.send(
+                    embed=embed,
+                    view=ImageResultView(images),
+                    ephemeral=True
+                )
+                await temp_message.delete()
+                
         except Exception as e:
             print(f"Error generating images: {e}")
             await interaction.followup.send(
@@ -2669,21 +2885,20 @@ class ImageResultView(discord.ui.View):
     async def save_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         current_image = self.images[self.current]
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(current_image['src']) as response:
-                    if response.status != 200:
-                        await interaction.response.send_message(
-                            "❌ Failed to download image.",
-                            ephemeral=True
-                        )
-                        return
-                    
-                    image_data = await response.read()
+            async with bot.http_client.get(current_image['src']) as response:
+                if response.status != 200:
                     await interaction.response.send_message(
-                        "✅ Here's your image:",
-                        file=discord.File(io.BytesIO(image_data), "generated_image.png"),
+                        "❌ Failed to download image.",
                         ephemeral=True
                     )
+                    return
+                
+                image_data = await response.read()
+                await interaction.response.send_message(
+                    "✅ Here's your image:",
+                    file=discord.File(io.BytesIO(image_data), "generated_image.png"),
+                    ephemeral=True
+                )
         except Exception as e:
             print(f"Error saving image: {e}")
             await interaction.response.send_message(
@@ -2711,10 +2926,6 @@ class ImageResultView(discord.ui.View):
     description="Generate images from text descriptions"
 )
 async def imagine(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     modal = ImagineModal()
     await interaction.response.send_modal(modal)
 
@@ -2819,31 +3030,30 @@ class MemeTextModal(discord.ui.Modal):
             
             print(f"Sending request with params: {params}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, data=params) as response:
-                    data = await response.json()
-                    print(f"API Response: {data}")
-                    
-                    if not data['success']:
-                        error_msg = data.get('error_message', 'Unknown error')
-                        print(f"API Error: {error_msg}")
-                        await interaction.followup.send(
-                            f"❌ Failed to generate meme: {error_msg}",
-                            ephemeral=True
-                        )
-                        return
-                    
-                    # Create embed with meme
-                    embed = discord.Embed(
-                        title=f"🎭 {self.template_name} Meme",
-                        description=f"Created by {interaction.user.name}",
-                        color=discord.Color.random()
+            async with bot.http_client.post(url, data=params) as response:
+                data = await response.json()
+                print(f"API Response: {data}")
+                
+                if not data['success']:
+                    error_msg = data.get('error_message', 'Unknown error')
+                    print(f"API Error: {error_msg}")
+                    await interaction.followup.send(
+                        f"❌ Failed to generate meme: {error_msg}",
+                        ephemeral=True
                     )
-                    embed.set_image(url=data['data']['url'])
-                    
-                    # Send as public message
-                    await interaction.channel.send(embed=embed)
-                    
+                    return
+                
+                # Create embed with meme
+                embed = discord.Embed(
+                    title=f"🎭 {self.template_name} Meme",
+                    description=f"Created by {interaction.user.name}",
+                    color=discord.Color.random()
+                )
+                embed.set_image(url=data['data']['url'])
+                
+                # Send as public message
+                await interaction.channel.send(embed=embed)
+                
         except Exception as e:
             print(f"Error generating meme: {e}")
             await interaction.followup.send(
@@ -2856,10 +3066,6 @@ class MemeTextModal(discord.ui.Modal):
     description="Generate a meme with your text"
 )
 async def meme(interaction: discord.Interaction):
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     # Get random templates from memes.py
     selected_templates = get_random_templates(4)
     
@@ -2941,80 +3147,79 @@ class YoutubeModal(discord.ui.Modal):
         await interaction.response.defer()
         
         try:
-            # Extract video info first
-            with yt_dlp.YoutubeDL() as ydl:
-                info = ydl.extract_info(self.url.value, download=False)
-                
-                # Get more detailed info
-                title = info['title']
-                thumbnail = info.get('thumbnail', '')
-                duration = info['duration']
-                channel = info.get('uploader', 'Unknown')
-                views = info.get('view_count', 0)
-                likes = info.get('like_count', 0)
-                upload_date = info.get('upload_date', '')
-                
-                # Format upload date
-                if upload_date:
-                    upload_date = f"{upload_date[:4]}-{upload_date[4:6]}-{upload_date[6:]}"
-                
-                # Parse timestamps
-                start_time, end_time = self.parse_timestamp(self.timestamp.value)
-                
-                # Create embed with more details
-                embed = discord.Embed(
-                    title=title,
-                    url=self.url.value,
-                    description=info.get('description', '')[:200] + "...",  # First 200 chars of description
-                    color=discord.Color.red()
-                )
-                
-                # Set large thumbnail
-                if thumbnail:
-                    embed.set_image(url=thumbnail)
-                
-                # Add video details
+            # yt-dlp blocks, so metadata is fetched on the media info pool
+            info = await bot.media_jobs.extract_info(self.url.value)
+            
+            # Get more detailed info
+            title = info['title']
+            thumbnail = info.get('thumbnail', '')
+            duration = info['duration']
+            channel = info.get('uploader', 'Unknown')
+            views = info.get('view_count', 0)
+            likes = info.get('like_count', 0)
+            upload_date = info.get('upload_date', '')
+            
+            # Format upload date
+            if upload_date:
+                upload_date = f"{upload_date[:4]}-{upload_date[4:6]}-{upload_date[6:]}"
+            
+            # Parse timestamps
+            start_time, end_time = self.parse_timestamp(self.timestamp.value)
+            
+            # Create embed with more details
+            embed = discord.Embed(
+                title=title,
+                url=self.url.value,
+                description=info.get('description', '')[:200] + "...",  # First 200 chars of description
+                color=discord.Color.red()
+            )
+            
+            # Set large thumbnail
+            if thumbnail:
+                embed.set_image(url=thumbnail)
+            
+            # Add video details
+            embed.add_field(
+                name="Channel",
+                value=channel,
+                inline=True
+            )
+            embed.add_field(
+                name="Duration",
+                value=f"{duration//60}:{duration%60:02d}",
+                inline=True
+            )
+            embed.add_field(
+                name="Views",
+                value=f"{views:,}",
+                inline=True
+            )
+            if likes:
                 embed.add_field(
-                    name="Channel",
-                    value=channel,
+                    name="Likes",
+                    value=f"👍 {likes:,}",
                     inline=True
                 )
+            if upload_date:
                 embed.add_field(
-                    name="Duration",
-                    value=f"{duration//60}:{duration%60:02d}",
+                    name="Upload Date",
+                    value=upload_date,
                     inline=True
                 )
+            
+            if start_time is not None and end_time is not None:
                 embed.add_field(
-                    name="Views",
-                    value=f"{views:,}",
+                    name="Selected Clip",
+                    value=f"From {start_time}s to {end_time}s",
                     inline=True
                 )
-                if likes:
-                    embed.add_field(
-                        name="Likes",
-                        value=f"👍 {likes:,}",
-                        inline=True
-                    )
-                if upload_date:
-                    embed.add_field(
-                        name="Upload Date",
-                        value=upload_date,
-                        inline=True
-                    )
-                
-                if start_time is not None and end_time is not None:
-                    embed.add_field(
-                        name="Selected Clip",
-                        value=f"From {start_time}s to {end_time}s",
-                        inline=True
-                    )
-                
-                embed.set_footer(text="Select a download option below")
-                
-                # Create view with download options
-                view = YoutubeDownloadView(self.url.value, info, start_time, end_time)
-                await interaction.followup.send(embed=embed, view=view, ephemeral=True)
             
+            embed.set_footer(text="Select a download option below")
+            
+            # Create view with download options
+            view = YoutubeDownloadView(self.url.value, info, start_time, end_time)
+            await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+        
         except Exception as e:
             print(f"Error processing YouTube URL: {e}")
             await interaction.followup.send(
@@ -3022,6 +3227,24 @@ class YoutubeModal(discord.ui.Modal):
                 ephemeral=True
             )
 
+class MediaJobView(discord.ui.View):
+    """Cancel button shown while a media job runs"""
+    def __init__(self, job):
+        super().__init__(timeout=None)
+        self.job = job
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.danger, emoji="✖️")
+    async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if interaction.user.id != self.job.owner_id:
+            await interaction.response.send_message(
+                "Only the person who started this download can cancel it.",
+                ephemeral=True
+            )
+            return
+        self.job.cancel()
+        button.disabled = True
+        await interaction.response.edit_message(content="🛑 Cancelling...", view=self)
+
 class YoutubeDownloadView(discord.ui.View):
     def __init__(self, url: str, info: dict, start_time: int = None, end_time: int = None):
         super().__init__(timeout=300)
@@ -3030,191 +3253,246 @@ class YoutubeDownloadView(discord.ui.View):
         self.start_time = start_time
         self.end_time = end_time
 
-    @discord.ui.button(label="Download MP4", style=discord.ButtonStyle.primary, emoji="🎥")
-    async def mp4_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer()
-        try:
+    async def start_job(self, interaction: discord.Interaction, description: str):
+        """Register a media job and post its status message with a cancel button"""
+        job = bot.media_jobs.new_job(interaction.user.id, description)
+        if job is None:
             await interaction.followup.send(
-                "⏳ Processing video... Please wait.",
+                "⏳ Too many downloads in progress. Please try again in a moment.",
                 ephemeral=True
             )
+            return None, None
+        status_message = await interaction.followup.send(
+            "⏳ Processing video... Please wait.",
+            view=MediaJobView(job),
+            ephemeral=True,
+            wait=True
+        )
+        # Hooks update the job as often as they like; the message itself is
+        # edited at most once every couple of seconds
+        job.start_reporting(lambda content: status_message.edit(content=content))
+        return job, status_message
+
+    async def end_job(self, job, status_message, text: str):
+        job.stop_reporting()
+        bot.media_jobs.finish(job)
+        try:
+            await status_message.edit(content=text, view=None)
+        except discord.HTTPException:
+            pass
+
+    def telegram_embed(self, video_link: str, encode_report: dict = None) -> discord.Embed:
+        embed = discord.Embed(
+            title="✅ Video Downloaded Successfully!",
+            description=f"Video was uploaded to Telegram.\n\n[Click here to watch/download]({video_link})",
+            color=discord.Color.green()
+        )
+        if self.start_time is not None and self.end_time is not None:
+            embed.add_field(
+                name="Clip Duration", 
+                value=f"From {self.start_time}s to {self.end_time}s"
+            )
+        if encode_report:
+            encoding = f"{encode_report['profile']} • {encode_report['size'] / 1024 ** 2:.1f}MB"
+            if encode_report['speed']:
+                encoding += f" • {encode_report['elapsed']:.0f}s ({encode_report['speed']:.1f}x realtime)"
+            embed.add_field(name="Encoding", value=encoding, inline=False)
+        embed.set_footer(text="The video will be available on Telegram")
+        return embed
+
+    def disk_estimate(self) -> int:
+        """Rough peak disk use of a download: the file plus a re-encoded copy"""
+        size = self.info.get('filesize') or self.info.get('filesize_approx') or DOWNLOAD_SIZE_ESTIMATE
+        if self.start_time is not None and self.end_time is not None and self.info.get('duration'):
+            size = size * max(self.end_time - self.start_time, 0) / self.info['duration']
+        return int(size * 2)
+
+    async def busy_message(self, interaction: discord.Interaction):
+        await interaction.followup.send(
+            "⏳ The server is busy with other downloads. Please try again in a few minutes.",
+            ephemeral=True
+        )
 
+    async def download_mp4(self, job, key: str):
+        """Download (re-encoding if needed) in a private workspace and move
+        the result into the media cache; returns (path, encode report)"""
+        async with bot.workspaces.workspace("mp4", self.disk_estimate()) as workspace:
             ydl_opts = {
                 'format': 'bv*[ext=mp4]+ba[ext=m4a]/b[ext=mp4] / bv*+ba/b',
-                'outtmpl': '%(title)s.%(ext)s',
+                'outtmpl': os.path.join(workspace.path, '%(title)s.%(ext)s'),
                 'quiet': False,
                 'no_warnings': False,
                 'merge_output_format': 'mp4',
+                # With a timestamp only that section is fetched, instead of
+                # the whole video followed by an ffmpeg trim
+                **clip_options(self.start_time, self.end_time)
             }
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(self.url, download=True)
-                filename = ydl.prepare_filename(info)
-                
-                if not filename.endswith('.mp4'):
-                    filename = filename.rsplit('.', 1)[0] + '.mp4'
-
-                if not os.path.exists(filename):
-                    raise Exception("Download failed - file not found")
-
-                # If timestamps are provided, trim the video
-                if self.start_time is not None and self.end_time is not None:
-                    output_filename = f"trimmed_{filename}"
-                    ffmpeg_cmd = [
-                        'ffmpeg', '-i', filename,
-                        '-ss', str(self.start_time),
-                        '-t', str(self.end_time - self.start_time),
-                        '-c', 'copy',
-                        output_filename
-                    ]
-                    
-                    process = await asyncio.create_subprocess_exec(
-                        *ffmpeg_cmd,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE
-                    )
-                    
-                    await process.communicate()
-                    os.remove(filename)
-                    filename = output_filename
-
-                # Check file size and compress if needed
-                file_size = os.path.getsize(filename)
-                if file_size > 50 * 1024 * 1024:  # If larger than 50MB
-                    compressed_filename = f"compressed_{filename}"
-                    compress_cmd = [
-                        'ffmpeg', '-i', filename,
-                        '-vf', 'scale=1280:-2',  # Scale to 720p
-                        '-c:v', 'libx264',
-                        '-crf', '28',  # Higher CRF = more compression
-                        '-c:a', 'aac',
-                        '-b:a', '128k',
-                        compressed_filename
-                    ]
-                    
-                    process = await asyncio.create_subprocess_exec(
-                        *compress_cmd,
-                        stdout=asyncio.subprocess.PIPE,
-                        stderr=asyncio.subprocess.PIPE
-                    )
-                    
-                    await process.communicate()
-                    os.remove(filename)
-                    filename = compressed_filename
+            # Download runs on the media pool; the cancel button stops it
+            # at the next progress hook. The info extracted for the embed
+            # is reused, so YouTube isn't asked for metadata again.
+            info, filename = await bot.media_jobs.run(job, ytdl_download, job, self.info, ydl_opts)
+            
+            if not filename.endswith('.mp4'):
+                filename = filename.rsplit('.', 1)[0] + '.mp4'
 
-                # Initialize Telegram bot and send video with longer timeout
-                bot = telegram.Bot(TELEGRAM_BOT_TOKEN)
-                
-                try:
-                    with open(filename, 'rb') as video_file:
-                        message = await bot.send_video(
-                            chat_id=TELEGRAM_CHAT_ID,
-                            video=video_file,
-                            caption=f"🎥 {info['title']}\n\nRequested by: {interaction.user.name}",
-                            read_timeout=300,  # 5 minutes timeout
-                            write_timeout=300,
-                            connect_timeout=300,
-                            pool_timeout=300
-                        )
-                        
-                        video_link = f"https://t.me/c/{TELEGRAM_CHAT_ID.replace('-100', '')}/{message.message_id}"
-                        
-                        embed = discord.Embed(
-                            title="✅ Video Downloaded Successfully!",
-                            description=f"Video was uploaded to Telegram.\n\n[Click here to watch/download]({video_link})",
-                            color=discord.Color.green()
-                        )
-                        if self.start_time is not None and self.end_time is not None:
-                            embed.add_field(
-                                name="Clip Duration", 
-                                value=f"From {self.start_time}s to {self.end_time}s"
-                            )
-                        embed.set_footer(text="The video will be available on Telegram")
-                        
-                        await interaction.followup.send(embed=embed, ephemeral=True)
-                        
-                except TelegramError as e:
-                    print(f"Telegram Error: {e}")
-                    await interaction.followup.send(
-                        "❌ Error uploading to Telegram. The file might be too large even after compression.",
-                        ephemeral=True
-                    )
-                
-                # Clean up
-                os.remove(filename)
+            if not os.path.exists(filename):
+                raise Exception("Download failed - file not found")
+
+            # Re-encode only if the download won't fit Telegram's limit,
+            # at the bitrate that fills it
+            encoded = await fit_to_size(
+                job, filename, workspace, TELEGRAM_UPLOAD_LIMIT, bot.media_jobs.encode_slots
+            )
+            return await bot.media_cache.put(key, encoded['path'], name=os.path.basename(filename)), encoded
+
+    @discord.ui.button(label="Download MP4", style=discord.ButtonStyle.primary, emoji="🎥")
+    async def mp4_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.defer()
+        key = media_key(self.info, "mp4", self.start_time, self.end_time, MP4_PROFILE)
+        # The cached file mustn't be evicted while it's being uploaded
+        with bot.media_cache.pinned(key):
+            await self.send_mp4(interaction, key)
+
+    async def send_mp4(self, interaction: discord.Interaction, key: str):
+        # Same video, clip and profile already uploaded: hand out that post
+        cached = bot.media_cache.get(key)
+        if cached and cached['link']:
+            await interaction.followup.send(embed=self.telegram_embed(cached['link']), ephemeral=True)
+            return
+
+        job, status_message = await self.start_job(interaction, f"MP4: {self.info.get('title', self.url)}")
+        if job is None:
+            return
+
+        encode_report = None
+        result = "✅ Done."
+        try:
+            if cached:
+                filename = cached['path']
+            else:
+                filename, encode_report = await self.download_mp4(job, key)
+
+            job.set_progress("Uploading to Telegram")
+            try:
+                message = await bot.telegram_uploader.upload_video(
+                    filename,
+                    caption=f"🎥 {self.info['title']}\n\nRequested by: {interaction.user.name}"
+                )
+                video_link = f"https://t.me/c/{TELEGRAM_CHAT_ID.replace('-100', '')}/{message.message_id}"
+                await bot.media_cache.set_link(key, video_link)
+                await interaction.followup.send(embed=self.telegram_embed(video_link, encode_report), ephemeral=True)
+                    
+            except UploadQueueFull:
+                result = "❌ Upload queue full."
+                await interaction.followup.send(
+                    "⏳ Too many Telegram uploads in progress. Press the button again in a moment; the video is cached.",
+                    ephemeral=True
+                )
+            except TelegramError as e:
+                print(f"Telegram Error: {e}")
+                result = "❌ Upload failed."
+                await interaction.followup.send(
+                    "❌ Error uploading to Telegram. The file might be too large even after compression.",
+                    ephemeral=True
+                )
                 
+        except JobCancelled:
+            result = "🛑 Download cancelled."
+        except QuotaExceeded:
+            result = "❌ Server busy."
+            await self.busy_message(interaction)
         except Exception as e:
             print(f"Error downloading MP4: {e}")
+            result = "❌ Download failed."
             await interaction.followup.send(
                 f"❌ Error downloading video: {str(e)}. Try downloading as audio instead.",
                 ephemeral=True
             )
+        finally:
+            await self.end_job(job, status_message, result)
 
     @discord.ui.button(label="Download MP3", style=discord.ButtonStyle.success, emoji="🎵")
     async def mp3_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer()
+        key = media_key(self.info, "mp3", self.start_time, self.end_time, MP3_PROFILE)
+        # The cached file mustn't be evicted while it's being sent
+        with bot.media_cache.pinned(key):
+            await self.send_mp3(interaction, key)
+
+    async def send_mp3(self, interaction: discord.Interaction, key: str):
+        # Discord attachment links expire, so the file itself is what's kept
+        cached = bot.media_cache.get(key)
+        if cached:
+            await interaction.followup.send(
+                "✅ Here's your audio:",
+                file=discord.File(cached['path'], filename=cached['name']),
+                ephemeral=True
+            )
+            return
+
+        job, status_message = await self.start_job(interaction, f"MP3: {self.info.get('title', self.url)}")
+        if job is None:
+            return
+
+        result = "✅ Done."
         try:
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'outtmpl': '%(title)s.%(ext)s',
-            }
-            
-            # Add timestamp options if provided
-            if self.start_time is not None and self.end_time is not None:
-                def download_range(info):
-                    return [{
-                        'start_time': self.start_time,
-                        'end_time': self.end_time
-                    }]
-                
-                ydl_opts['download_ranges'] = download_range
-                ydl_opts['force_keyframes_at_cuts'] = True
-                ydl_opts['postprocessor_args'] = [
-                    '-ss', str(self.start_time),
-                    '-t', str(self.end_time - self.start_time)
-                ]
+            async with bot.workspaces.workspace("mp3", self.disk_estimate()) as workspace:
+                ydl_opts = {
+                    'format': 'bestaudio/best',
+                    'postprocessors': [{
+                        'key': 'FFmpegExtractAudio',
+                        'preferredcodec': 'mp3',
+                        'preferredquality': '192',
+                    }],
+                    'outtmpl': os.path.join(workspace.path, '%(title)s.%(ext)s'),
+                    # The section download already cuts the clip, so the audio
+                    # extractor must not seek again
+                    **clip_options(self.start_time, self.end_time)
+                }
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(self.url, download=True)
-                filename = ydl.prepare_filename(info).rsplit(".", 1)[0] + ".mp3"
+                info, filename = await bot.media_jobs.run(job, ytdl_download, job, self.info, ydl_opts)
+                filename = filename.rsplit(".", 1)[0] + ".mp3"
+                name = os.path.basename(filename)
+                filename = await bot.media_cache.put(key, filename, name=name)
                 
             # Send the file
             await interaction.followup.send(
                 "✅ Here's your audio:",
-                file=discord.File(filename),
+                file=discord.File(filename, filename=name),
                 ephemeral=True
             )
-            # Clean up
-            os.remove(filename)
             
+        except JobCancelled:
+            result = "🛑 Download cancelled."
+        except QuotaExceeded:
+            result = "❌ Server busy."
+            await self.busy_message(interaction)
         except Exception as e:
             print(f"Error downloading MP3: {e}")
+            result = "❌ Download failed."
             await interaction.followup.send(
                 "❌ Error downloading audio. Try a different format.",
                 ephemeral=True
             )
+        finally:
+            await self.end_job(job, status_message, result)
 
     @discord.ui.button(label="Download Thumbnail", style=discord.ButtonStyle.secondary, emoji="🖼️")
     async def thumbnail_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.defer()
         try:
             thumbnail_url = self.info['thumbnail']
-            async with aiohttp.ClientSession() as session:
-                async with session.get(thumbnail_url) as resp:
-                    if resp.status == 200:
-                        data = await resp.read()
-                        await interaction.followup.send(
-                            "✅ Here's the thumbnail:",
-                            file=discord.File(io.BytesIO(data), 'thumbnail.jpg'),
-                            ephemeral=True
-                        )
-                    else:
-                        raise Exception(f"HTTP {resp.status}")
+            async with bot.http_client.get(thumbnail_url) as resp:
+                if resp.status == 200:
+                    data = await resp.read()
+                    await interaction.followup.send(
+                        "✅ Here's the thumbnail:",
+                        file=discord.File(io.BytesIO(data), 'thumbnail.jpg'),
+                        ephemeral=True
+                    )
+                else:
+                    raise Exception(f"HTTP {resp.status}")
                         
         except Exception as e:
             print(f"Error downloading thumbnail: {e}")
@@ -3229,10 +3507,6 @@ class YoutubeDownloadView(discord.ui.View):
 )
 async def ytdownload(interaction: discord.Interaction):
     """Download videos from YouTube"""
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     modal = YoutubeModal()
     await interaction.response.send_modal(modal)
 
@@ -3242,10 +3516,6 @@ async def ytdownload(interaction: discord.Interaction):
 )
 async def help_command(interaction: discord.Interaction):
     """Shows all available commands"""
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     embed = discord.Embed(
         title="🤖 Bot Commands",
         description="Here are all the available commands:",
@@ -3294,6 +3564,8 @@ async def help_command(interaction: discord.Interaction):
     gaming = """
 `/valorant` - Get Valorant player stats
 `/valstats` - Detailed Valorant statistics
+`/mcserverstatus` - Check a Minecraft server
+`/mcwatch` - Get alerts when a Minecraft server changes
 """
     embed.add_field(name="🎮 Gaming", value=gaming, inline=False)
 
@@ -3316,10 +3588,6 @@ async def help_command(interaction: discord.Interaction):
 )
 async def hack(interaction: discord.Interaction, user: discord.Member):
     """Pretends to hack someone with a fun animation"""
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-        
     await interaction.response.send_message(f"**{interaction.user.name}** is attempting to hack **{user.name}**...")
     
     # Pool of possible steps with their success rates
@@ -3394,10 +3662,6 @@ Time: {random.randint(30,120)} seconds```"""
 )
 async def ip(interaction: discord.Interaction, user: discord.Member):
     """Generates a fake IP address for the joke"""
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-        
     # Generate a random fake IP
     fake_ip = f"{random.randint(1,255)}.{random.randint(1,255)}.{random.randint(1,255)}.{random.randint(1,255)}"
     
@@ -3421,10 +3685,6 @@ async def ip(interaction: discord.Interaction, user: discord.Member):
 )
 async def cardgen(interaction: discord.Interaction, card_type: Literal["Visa", "Mastercard", "American Express", "Rupay"]):
     """Generates fake card details"""
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     # Card number patterns
     card_patterns = {
         "Visa": "4",
@@ -3536,10 +3796,6 @@ async def cardgen(interaction: discord.Interaction, card_type: Literal["Visa", "
 )
 async def fakenitro(interaction: discord.Interaction):
     """Sends a fake Nitro gift that Rickrolls"""
-    if interaction.user.id not in settings.get("allowed_users"):
-        await unauthorized_message(interaction)
-        return
-
     # Create a fake gift link
     gift_codes = [
         "xPvPfJNMhKqW9dzj",
@@ -3587,7 +3843,11 @@ def keep_alive():
     t = Thread(target=run)
     t.start()
 
-# Modify the bottom of your file to:
-if __name__ == "__main__":
+def main():
     keep_alive()    # Start the web server in a background thread
-    bot.run(TOKEN)  # Then run the bot
\ No newline at end of file
+    bot.run(TOKEN)  # Then run the bot
+
+# Started from start.py; run directly, every image worker would import
+# this whole module again as __mp_main__
+if __name__ == "__main__":
+    main()
\ No newline at end of file
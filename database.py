@@ -1,9 +1,13 @@
 from supabase import create_client
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 import json
 from config import OWNER_ID
+from cache import TTLCache
+from triggers import TriggerMatcher
 from typing import List, Dict
 
 # Load environment variables
@@ -24,6 +28,32 @@ except Exception as e:
     print(f"Error connecting to Supabase: {e}")
     raise
 
+# supabase-py is synchronous, so every query runs on a small dedicated thread
+# pool instead of the event loop. The single client above is shared by all
+# workers, which keeps its HTTP connections alive between queries.
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", 4))
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="supabase")
+
+# Triggers are read on every message, so keep each guild's list in memory.
+# Writes below update the cached list in place; the TTL only bounds how long
+# edits made outside this process can go unnoticed.
+TRIGGER_CACHE_TTL = int(os.getenv("TRIGGER_CACHE_TTL", 300))
+_trigger_cache = TTLCache(TRIGGER_CACHE_TTL)
+# server_id -> (cached trigger list, TriggerMatcher compiled from it)
+_trigger_matchers = {}
+
+# Authorization index consulted on every command. Loaded once at startup by
+# load_auth_index() and kept current by the allowed-user and blacklist
+# writers below, so permission checks never touch the network.
+_allowed_ids = frozenset([OWNER_ID])
+_blacklisted_ids = frozenset()
+_blacklist_loaded = False
+
+async def _execute(query):
+    """Run a query builder's execute() without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, query.execute)
+
 async def log_unauthorized_access(user_id: int, username: str, server_name: str):
     try:
         data = {
@@ -32,19 +62,20 @@ async def log_unauthorized_access(user_id: int, username: str, server_name: str)
             "server": server_name,
             "access_time": datetime.now().isoformat()
         }
-        supabase.table("unauthorized_access").insert(data).execute()
+        await _execute(supabase.table("unauthorized_access").insert(data))
     except Exception as e:
         print(f"Error logging unauthorized access: {e}")
 
 async def get_unauthorized_users(page: int = 0, per_page: int = 5):
     try:
-        response = supabase.table("unauthorized_access") \
-            .select("*") \
-            .order("access_time", desc=True) \
-            .range(page * per_page, (page + 1) * per_page - 1) \
-            .execute()
-        
-        total = supabase.table("unauthorized_access").select("count", count="exact").execute()
+        # Fetch the page and the total count concurrently
+        response, total = await asyncio.gather(
+            _execute(supabase.table("unauthorized_access") \
+                .select("*") \
+                .order("access_time", desc=True) \
+                .range(page * per_page, (page + 1) * per_page - 1)),
+            _execute(supabase.table("unauthorized_access").select("count", count="exact"))
+        )
         return response.data, total.count
     except Exception as e:
         print(f"Error fetching unauthorized users: {e}")
@@ -53,14 +84,14 @@ async def get_unauthorized_users(page: int = 0, per_page: int = 5):
 async def save_gemini_key(api_key: str):
     try:
         # Check if key exists
-        response = supabase.table("settings").select("*").eq("key", "gemini_api_key").execute()
+        response = await _execute(supabase.table("settings").select("*").eq("key", "gemini_api_key"))
         
         if response.data:
             # Update existing key
-            supabase.table("settings").update({"value": api_key}).eq("key", "gemini_api_key").execute()
+            await _execute(supabase.table("settings").update({"value": api_key}).eq("key", "gemini_api_key"))
         else:
             # Insert new key
-            supabase.table("settings").insert({"key": "gemini_api_key", "value": api_key}).execute()
+            await _execute(supabase.table("settings").insert({"key": "gemini_api_key", "value": api_key}))
         return True
     except Exception as e:
         print(f"Error saving Gemini API key: {e}")
@@ -68,7 +99,7 @@ async def save_gemini_key(api_key: str):
 
 async def get_gemini_key():
     try:
-        response = supabase.table("settings").select("value").eq("key", "gemini_api_key").execute()
+        response = await _execute(supabase.table("settings").select("value").eq("key", "gemini_api_key"))
         if response.data:
             return response.data[0]['value']
         return None
@@ -78,11 +109,11 @@ async def get_gemini_key():
 
 async def save_bot_prefix(prefix: str):
     try:
-        response = supabase.table("settings").select("*").eq("key", "bot_prefix").execute()
+        response = await _execute(supabase.table("settings").select("*").eq("key", "bot_prefix"))
         if response.data:
-            supabase.table("settings").update({"value": prefix}).eq("key", "bot_prefix").execute()
+            await _execute(supabase.table("settings").update({"value": prefix}).eq("key", "bot_prefix"))
         else:
-            supabase.table("settings").insert({"key": "bot_prefix", "value": prefix}).execute()
+            await _execute(supabase.table("settings").insert({"key": "bot_prefix", "value": prefix}))
         return True
     except Exception as e:
         print(f"Error saving bot prefix: {e}")
@@ -90,7 +121,7 @@ async def save_bot_prefix(prefix: str):
 
 async def get_bot_prefix():
     try:
-        response = supabase.table("settings").select("value").eq("key", "bot_prefix").execute()
+        response = await _execute(supabase.table("settings").select("value").eq("key", "bot_prefix"))
         if response.data:
             return response.data[0]['value']
         return "/"  # Default prefix
@@ -99,12 +130,14 @@ async def get_bot_prefix():
         return "/"
 
 async def save_allowed_users(users: list):
+    global _allowed_ids
     try:
-        response = supabase.table("settings").select("*").eq("key", "allowed_users").execute()
+        response = await _execute(supabase.table("settings").select("*").eq("key", "allowed_users"))
         if response.data:
-            supabase.table("settings").update({"value": json.dumps(users)}).eq("key", "allowed_users").execute()
+            await _execute(supabase.table("settings").update({"value": json.dumps(users)}).eq("key", "allowed_users"))
         else:
-            supabase.table("settings").insert({"key": "allowed_users", "value": json.dumps(users)}).execute()
+            await _execute(supabase.table("settings").insert({"key": "allowed_users", "value": json.dumps(users)}))
+        _allowed_ids = frozenset(users) | {OWNER_ID}
         return True
     except Exception as e:
         print(f"Error saving allowed users: {e}")
@@ -112,7 +145,7 @@ async def save_allowed_users(users: list):
 
 async def get_allowed_users():
     try:
-        response = supabase.table("settings").select("value").eq("key", "allowed_users").execute()
+        response = await _execute(supabase.table("settings").select("value").eq("key", "allowed_users"))
         if response.data:
             return json.loads(response.data[0]['value'])
         # If no data in Supabase, initialize with owner ID
@@ -156,7 +189,7 @@ async def save_note(title: str, content: str):
             "content": content,
             "created_at": timestamp
         }
-        response = supabase.table("notes").insert(data).execute()
+        response = await _execute(supabase.table("notes").insert(data))
         return True
     except Exception as e:
         print(f"Error saving note: {e}")
@@ -165,14 +198,14 @@ async def save_note(title: str, content: str):
 async def get_notes(page: int = 0, per_page: int = 5):
     try:
         start = page * per_page
-        response = supabase.table("notes") \
-            .select("*") \
-            .order("created_at", desc=True) \
-            .range(start, start + per_page - 1) \
-            .execute()
-        
-        # Get total count
-        total = supabase.table("notes").select("count", count="exact").execute()
+        # Get the page and the total count concurrently
+        response, total = await asyncio.gather(
+            _execute(supabase.table("notes") \
+                .select("*") \
+                .order("created_at", desc=True) \
+                .range(start, start + per_page - 1)),
+            _execute(supabase.table("notes").select("count", count="exact"))
+        )
         
         return response.data, total.count
     except Exception as e:
@@ -181,10 +214,9 @@ async def get_notes(page: int = 0, per_page: int = 5):
 
 async def update_note(note_id: int, content: str):
     try:
-        response = supabase.table("notes") \
+        response = await _execute(supabase.table("notes") \
             .update({"content": content}) \
-            .eq("id", note_id) \
-            .execute()
+            .eq("id", note_id))
         return True
     except Exception as e:
         print(f"Error updating note: {e}")
@@ -192,10 +224,9 @@ async def update_note(note_id: int, content: str):
 
 async def delete_note(note_id: int):
     try:
-        response = supabase.table("notes") \
+        response = await _execute(supabase.table("notes") \
             .delete() \
-            .eq("id", note_id) \
-            .execute()
+            .eq("id", note_id))
         return True
     except Exception as e:
         print(f"Error deleting note: {e}")
@@ -203,27 +234,73 @@ async def delete_note(note_id: int):
 
 async def save_trigger(name: str, response: str, server_id: int) -> bool:
     try:
-        data = supabase.table('triggers').insert({
+        data = await _execute(supabase.table('triggers').insert({
             "name": name,
             "response": response,
             "server_id": server_id
-        }).execute()
+        }))
+        # Write the new row through to the cache, or drop the entry if the
+        # insert didn't echo it back
+        cached = _trigger_cache.peek(server_id)
+        if cached is not None:
+            if data.data:
+                cached.extend(data.data)
+            else:
+                _trigger_cache.pop(server_id)
+            _trigger_matchers.pop(server_id, None)
         return True
     except Exception as e:
         print(f"Error saving trigger: {e}")
         return False
 
-async def get_triggers(server_id: int) -> list:
+async def _load_triggers(server_id: int) -> list:
+    """Return the cached trigger list for a guild, fetching it on a miss"""
+    cached = _trigger_cache.get(server_id)
+    if cached is not None:
+        return cached
     try:
-        response = supabase.table('triggers').select("*").eq('server_id', server_id).execute()
-        return response.data
+        response = await _execute(supabase.table('triggers').select("*").eq('server_id', server_id))
+        triggers = list(response.data)
+        _trigger_cache.set(server_id, triggers)
+        return triggers
     except Exception as e:
         print(f"Error getting triggers: {e}")
         return []
 
+async def get_triggers(server_id: int) -> list:
+    return list(await _load_triggers(server_id))
+
+async def get_trigger_matcher(server_id: int) -> TriggerMatcher:
+    """Return the compiled matcher for a guild's current trigger set"""
+    triggers = await _load_triggers(server_id)
+    entry = _trigger_matchers.get(server_id)
+    # A refill of the cache produces a new list, so identity tells us
+    # whether the compiled automaton is still current
+    if entry is None or entry[0] is not triggers:
+        entry = (triggers, TriggerMatcher(triggers))
+        _trigger_matchers[server_id] = entry
+    return entry[1]
+
+def _find_cached_trigger(trigger_id: int):
+    """Return (server_id, triggers, index) for a cached trigger, or None"""
+    for server_id, triggers in _trigger_cache.items():
+        for index, trigger in enumerate(triggers):
+            if trigger.get('id') == trigger_id:
+                return server_id, triggers, index
+    return None
+
+def get_trigger_cache_stats() -> dict:
+    """Hit/miss counters for the per-guild trigger cache"""
+    return _trigger_cache.stats()
+
 async def delete_trigger(trigger_id: int) -> bool:
     try:
-        supabase.table('triggers').delete().eq('id', trigger_id).execute()
+        await _execute(supabase.table('triggers').delete().eq('id', trigger_id))
+        found = _find_cached_trigger(trigger_id)
+        if found:
+            server_id, triggers, index = found
+            del triggers[index]
+            _trigger_matchers.pop(server_id, None)
         return True
     except Exception as e:
         print(f"Error deleting trigger: {e}")
@@ -231,10 +308,15 @@ async def delete_trigger(trigger_id: int) -> bool:
 
 async def update_trigger(trigger_id: int, name: str, response: str) -> bool:
     try:
-        supabase.table('triggers').update({
+        await _execute(supabase.table('triggers').update({
             "name": name,
             "response": response
-        }).eq('id', trigger_id).execute()
+        }).eq('id', trigger_id))
+        found = _find_cached_trigger(trigger_id)
+        if found:
+            server_id, triggers, index = found
+            triggers[index] = {**triggers[index], "name": name, "response": response}
+            _trigger_matchers.pop(server_id, None)
         return True
     except Exception as e:
         print(f"Error updating trigger: {e}")
@@ -242,12 +324,14 @@ async def update_trigger(trigger_id: int, name: str, response: str) -> bool:
 
 async def add_to_blacklist(user_id: int, reason: str = "Unauthorized action") -> bool:
     """Add a user to the blacklist"""
+    global _blacklisted_ids
     try:
-        response = supabase.table('blacklist').insert({
+        response = await _execute(supabase.table('blacklist').insert({
             'user_id': user_id,
             'reason': reason,
             'timestamp': datetime.now().isoformat()
-        }).execute()
+        }))
+        _blacklisted_ids = _blacklisted_ids | {user_id}
         return True
     except Exception as e:
         print(f"Error adding user to blacklist: {e}")
@@ -255,8 +339,10 @@ async def add_to_blacklist(user_id: int, reason: str = "Unauthorized action") ->
 
 async def remove_from_blacklist(user_id: int) -> bool:
     """Remove a user from the blacklist"""
+    global _blacklisted_ids
     try:
-        response = supabase.table('blacklist').delete().eq('user_id', user_id).execute()
+        response = await _execute(supabase.table('blacklist').delete().eq('user_id', user_id))
+        _blacklisted_ids = _blacklisted_ids - {user_id}
         return True
     except Exception as e:
         print(f"Error removing user from blacklist: {e}")
@@ -264,8 +350,10 @@ async def remove_from_blacklist(user_id: int) -> bool:
 
 async def is_blacklisted(user_id: int) -> bool:
     """Check if a user is blacklisted"""
+    if _blacklist_loaded:
+        return user_id in _blacklisted_ids
     try:
-        response = supabase.table('blacklist').select('user_id').eq('user_id', user_id).execute()
+        response = await _execute(supabase.table('blacklist').select('user_id').eq('user_id', user_id))
         return len(response.data) > 0
     except Exception as e:
         print(f"Error checking blacklist: {e}")
@@ -274,8 +362,63 @@ async def is_blacklisted(user_id: int) -> bool:
 async def get_blacklist() -> List[Dict]:
     """Get all blacklisted users"""
     try:
-        response = supabase.table('blacklist').select('*').execute()
+        response = await _execute(supabase.table('blacklist').select('*'))
         return response.data
     except Exception as e:
         print(f"Error getting blacklist: {e}")
-        return [] 
\ No newline at end of file
+        return [] 
+
+async def load_auth_index():
+    """Load allowed and blacklisted user IDs into the in-memory index"""
+    global _allowed_ids, _blacklisted_ids, _blacklist_loaded
+    allowed_users = await get_allowed_users()
+    _allowed_ids = frozenset(allowed_users) | {OWNER_ID}
+    try:
+        response = await _execute(supabase.table('blacklist').select('user_id'))
+        _blacklisted_ids = frozenset(int(row['user_id']) for row in response.data)
+        _blacklist_loaded = True
+    except Exception as e:
+        # Leave is_blacklisted() on its per-call fallback until the next load
+        print(f"Error loading blacklist: {e}")
+
+def is_authorized(user_id: int) -> bool:
+    """Check if a user may use the bot's commands"""
+    return user_id in _allowed_ids and user_id not in _blacklisted_ids
+
+def get_allowed_user_ids() -> frozenset:
+    """Get the IDs of all allowed users"""
+    return _allowed_ids
+
+async def add_mc_watch(channel_id: int, ip: str, port: int = None, player_threshold: int = None, user_id: int = None):
+    """Add a Minecraft server to a channel's watchlist; returns the new row or None"""
+    try:
+        response = await _execute(supabase.table('mc_watchlist').insert({
+            'channel_id': channel_id,
+            'ip': ip,
+            'port': port,
+            'player_threshold': player_threshold,
+            'added_by': user_id,
+            'created_at': datetime.now().isoformat()
+        }))
+        return response.data[0] if response.data else None
+    except Exception as e:
+        print(f"Error adding watch: {e}")
+        return None
+
+async def remove_mc_watch(watch_id: int, channel_id: int) -> bool:
+    """Remove a watch, only if it belongs to the given channel"""
+    try:
+        response = await _execute(supabase.table('mc_watchlist').delete().eq('id', watch_id).eq('channel_id', channel_id))
+        return len(response.data) > 0
+    except Exception as e:
+        print(f"Error removing watch: {e}")
+        return False
+
+async def get_mc_watches() -> List[Dict]:
+    """Get every watched Minecraft server"""
+    try:
+        response = await _execute(supabase.table('mc_watchlist').select('*'))
+        return response.data
+    except Exception as e:
+        print(f"Error getting watchlist: {e}")
+        return []
\ No newline at end of file
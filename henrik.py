@@ -0,0 +1,158 @@
+import asyncio
+import time
+from urllib.parse import quote
+from cache import TTLCache
+
+HENRIK_API_BASE = "https://api.henrikdev.xyz/valorant"
+
+# How long each kind of response stays fresh, in seconds
+ACCOUNT_TTL = 3600
+MMR_TTL = 300
+MATCHES_TTL = 120
+
+# Basic Henrik keys allow 30 requests per minute
+RATE_LIMIT_REQUESTS = 30
+RATE_LIMIT_PERIOD = 60
+
+
+class HenrikAPIError(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"Henrik API returned {status}: {message}")
+        self.status = status
+
+
+class TokenBucket:
+    """Client-side rate limiter kept in step with the API's rate-limit headers"""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def update(self, headers):
+        """Trust the server's view of the remaining quota over our own"""
+        try:
+            remaining = int(headers["x-ratelimit-remaining"])
+            reset = float(headers.get("x-ratelimit-reset", RATE_LIMIT_PERIOD))
+        except (KeyError, ValueError):
+            return
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class HenrikClient:
+    """Async client for the Henrik Valorant API with per-endpoint TTL caches"""
+
+    def __init__(self, http_client, api_key: str):
+        self.http = http_client
+        self.headers = {"Authorization": api_key} if api_key and api_key != "your_henrik_api_key_here" else {}
+        self.bucket = TokenBucket(RATE_LIMIT_REQUESTS, RATE_LIMIT_PERIOD)
+        self.accounts = TTLCache(ACCOUNT_TTL, maxsize=1000)
+        self.mmr = TTLCache(MMR_TTL, maxsize=1000)
+        self.matches = TTLCache(MATCHES_TTL, maxsize=1000)
+
+    async def _get(self, path: str, params: dict = None) -> dict:
+        for attempt in range(2):
+            await self.bucket.acquire()
+            async with self.http.get(f"{HENRIK_API_BASE}{path}", headers=self.headers, params=params) as response:
+                self.bucket.update(response.headers)
+                if response.status == 429 and attempt == 0:
+                    # Rate limited anyway (shared key?): wait it out once and retry
+                    self.bucket.block(float(response.headers.get("retry-after", RATE_LIMIT_PERIOD)))
+                    continue
+                data = await response.json(content_type=None)
+                if response.status != 200:
+                    raise HenrikAPIError(response.status, str(data.get("errors", "")) if isinstance(data, dict) else "")
+                return data
+        raise HenrikAPIError(429, "rate limited")
+
+    @staticmethod
+    def _player_path(name: str, tag: str) -> str:
+        return f"{quote(name, safe='')}/{quote(tag, safe='')}"
+
+    async def get_account(self, name: str, tag: str) -> dict:
+        """Account data for a Riot ID, including its region"""
+        key = (name.lower(), tag.lower())
+        account = self.accounts.get(key)
+        if account is None:
+            data = await self._get(f"/v1/account/{self._player_path(name, tag)}")
+            account = data.get('data', {})
+            self.accounts.set(key, account)
+        return account
+
+    async def get_mmr(self, region: str, name: str, tag: str) -> dict:
+        key = (region, name.lower(), tag.lower())
+        mmr = self.mmr.get(key)
+        if mmr is None:
+            data = await self._get(f"/v2/mmr/{region}/{self._player_path(name, tag)}")
+            mmr = data.get('data') or {}
+            self.mmr.set(key, mmr)
+        return mmr
+
+    async def get_matches(self, region: str, name: str, tag: str, size: int = 5, mode: str = None) -> list:
+        key = (region, name.lower(), tag.lower(), size, mode)
+        matches = self.matches.get(key)
+        if matches is None:
+            params = {"size": size}
+            if mode:
+                params["mode"] = mode
+            data = await self._get(f"/v3/matches/{region}/{self._player_path(name, tag)}", params=params)
+            matches = data.get('data') or []
+            self.matches.set(key, matches)
+        return matches
+
+    async def get_stored_matches(self, region: str, name: str, tag: str, page: int = 1, size: int = 25) -> list:
+        """One page of a player's stored match history, newest first (not cached)"""
+        data = await self._get(
+            f"/v1/stored-matches/{region}/{self._player_path(name, tag)}",
+            params={"page": page, "size": size}
+        )
+        return data.get('data') or []
+
+    async def get_profile(self, name: str, tag: str, match_size: int = 1, match_mode: str = "competitive"):
+        """Fetch account, MMR and recent matches for a player.
+
+        The account lookup gives us the region; MMR and matches are then
+        requested concurrently. Either of those may come back as None if
+        the API has no data for the player.
+        """
+        account = await self.get_account(name, tag)
+        region = account.get('region', 'eu').lower()
+        mmr, matches = await asyncio.gather(
+            self.get_mmr(region, name, tag),
+            self.get_matches(region, name, tag, size=match_size, mode=match_mode),
+            return_exceptions=True
+        )
+        if isinstance(mmr, Exception):
+            print(f"Error fetching MMR for {name}#{tag}: {mmr}")
+            mmr = None
+        if isinstance(matches, Exception):
+            print(f"Error fetching matches for {name}#{tag}: {matches}")
+            matches = None
+        return account, mmr, matches
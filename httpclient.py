@@ -0,0 +1,85 @@
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+import aiohttp
+
+# Connection pool settings shared by every outbound request
+MAX_CONNECTIONS = 100
+MAX_CONNECTIONS_PER_HOST = 10
+DNS_CACHE_TTL = 300  # seconds
+KEEPALIVE_TIMEOUT = 30  # seconds
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=10, sock_read=20)
+# Hosts with their own latency metrics; requests to any others are counted
+# together under OTHER_HOSTS so user-supplied URLs can't grow the table forever
+MAX_TRACKED_HOSTS = 50
+OTHER_HOSTS = "(other hosts)"
+
+
+class HTTPClient:
+    """Bot-wide pooled aiohttp session with per-host latency metrics"""
+
+    def __init__(self):
+        self.session = None
+        self._metrics = {}
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=MAX_CONNECTIONS,
+            limit_per_host=MAX_CONNECTIONS_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        """Send a request through the shared session and time it.
+
+        Latency is measured up to the response headers; the response body
+        is read by the caller inside the ``async with`` block.
+        """
+        host = urlsplit(url).hostname or "unknown"
+        start = time.perf_counter()
+        try:
+            response = await self.session.request(method, url, **kwargs)
+        except Exception:
+            self._record(host, time.perf_counter() - start, failed=True)
+            raise
+        self._record(host, time.perf_counter() - start, failed=False)
+        try:
+            yield response
+        finally:
+            response.release()
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def _record(self, host: str, elapsed: float, failed: bool):
+        if host not in self._metrics and len(self._metrics) >= MAX_TRACKED_HOSTS:
+            host = OTHER_HOSTS
+        metrics = self._metrics.setdefault(host, {"requests": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        elapsed_ms = elapsed * 1000
+        metrics["requests"] += 1
+        metrics["total_ms"] += elapsed_ms
+        metrics["max_ms"] = max(metrics["max_ms"], elapsed_ms)
+        if failed:
+            metrics["errors"] += 1
+
+    def stats(self) -> dict:
+        """Per-host request count, error count and average/max latency in ms"""
+        return {
+            host: {
+                "requests": m["requests"],
+                "errors": m["errors"],
+                "avg_ms": m["total_ms"] / m["requests"],
+                "max_ms": m["max_ms"]
+            }
+            for host, m in self._metrics.items()
+        }
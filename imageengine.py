@@ -0,0 +1,457 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import struct
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageOps, ImageSequence
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Images a batch downloads or holds converted at once; one extra per worker
+# so the next image is ready when a worker frees up
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", IMAGE_WORKERS * 2))
+# Largest image (width x height) we'll decode; a 40MP RGBA image is 160MB in memory.
+# JPEGs count at the size they're decoded at, which can be far below their own.
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", 40_000_000))
+# Pillow refuses anything over twice this as a decompression bomb
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_SOURCE_PIXELS", 100_000_000))
+# Icons can't be bigger than this, so there's no point decoding more
+ICO_SIZE = (256, 256)
+
+# Format names users type, mapped to Pillow's
+FORMATS = {
+    'png': 'PNG',
+    'jpg': 'JPEG',
+    'jpeg': 'JPEG',
+    'webp': 'WEBP',
+    'gif': 'GIF',
+    'bmp': 'BMP',
+    'ico': 'ICO'
+}
+# Formats without an alpha channel; transparent images are put on white
+OPAQUE_FORMATS = ('JPEG', 'BMP')
+# Already-compressed formats are stored in ZIPs as-is
+STORED_FORMATS = ('PNG', 'JPEG', 'WEBP', 'GIF')
+# Targets that keep every frame of an animation; the rest get the first frame
+ANIMATED_FORMATS = ('GIF', 'WEBP', 'PNG')
+# Total pixels across all frames of an animation, which bounds encode time
+IMAGE_MAX_ANIMATION_PIXELS = int(os.getenv("IMAGE_MAX_ANIMATION_PIXELS", 1_000_000_000))
+# What browsers show a frame with no (or a zero) delay for
+DEFAULT_FRAME_MS = 100
+
+# Optimize-for-size: quality range searched for lossy formats, and how
+# many times we'll shrink the image if even the lowest quality is too big
+QUALITY_FORMATS = ('JPEG', 'WEBP')
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+MAX_DOWNSCALES = 5
+
+_pool = None
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Forking the bot would copy its gateway, database and media threads'
+        # locks into the workers mid-use; start them from a clean process.
+        # They re-run the main script's top level, which is why the bot is
+        # started from start.py
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+async def run_in_pool(func, *args):
+    """Run a picklable function in the shared image worker processes"""
+    global _pool
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool on the next call
+        if _pool is pool:
+            _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def open_checked(data: bytes, max_size: tuple = None) -> Image.Image:
+    """Open an image, refusing it before any pixels are decoded if it's over the budget.
+
+    With ``max_size``, a JPEG is set up to decode at the smallest of 1/2,
+    1/4 or 1/8 scale that still covers it, and is judged at that size.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    if max_size and image.format == "JPEG":
+        if image.getexif().get(0x0112) in (5, 6, 7, 8):
+            # Stored sideways; the box is for the image as shown
+            max_size = max_size[::-1]
+        image.draft(None, max_size)
+    width, height = image.size
+    if width * height > IMAGE_MAX_PIXELS:
+        image.close()
+        raise ImageTooLarge(f"{width}x{height} is over the {IMAGE_MAX_PIXELS / 1e6:.0f}MP limit")
+    return image
+
+
+def load_image(data: bytes, max_size: tuple = None) -> Image.Image:
+    """Decode a still image the right way up, no larger than ``max_size`` if given.
+
+    This is the one place uploads get decoded: JPEGs decode straight at a
+    reduced scale, other formats are shrunk by whole-pixel binning before
+    any resampling, and the EXIF orientation is applied.
+    """
+    image = open_checked(data, max_size)
+    image.load()
+    if max_size:
+        if image.getexif().get(0x0112) in (5, 6, 7, 8):
+            max_size = max_size[::-1]
+        # Uses reduce() for the bulk of the shrink, then a resample
+        image.thumbnail(max_size)
+    ImageOps.exif_transpose(image, in_place=True)
+    return image
+
+
+def flatten(image: Image.Image) -> Image.Image:
+    """RGB copy of an image, with any transparency composited onto white"""
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        return flat
+    return image.convert("RGB")
+
+
+def _frames(image: Image.Image):
+    """Yield (RGBA frame, duration in ms) one at a time, enforcing the animation budget"""
+    max_frames = max(1, IMAGE_MAX_ANIMATION_PIXELS // (image.width * image.height))
+    for index, frame in enumerate(ImageSequence.Iterator(image)):
+        if index >= max_frames:
+            raise ImageTooLarge(f"more than {max_frames} frames at {image.width}x{image.height}")
+        # Some formats only fill in the frame's info once it's decoded
+        frame.load()
+        duration = frame.info.get("duration") or DEFAULT_FRAME_MS
+        rgba = frame.convert("RGBA")
+        rgba.info = {}
+        yield rgba, int(duration)
+
+
+def _plays(image: Image.Image) -> int:
+    """How many times the animation plays, 0 meaning forever"""
+    loop = image.info.get("loop")
+    if image.format == "GIF":
+        # GIF stores repeats after the first play, and no loop block means play once
+        return 1 if loop is None else (0 if loop == 0 else loop + 1)
+    return loop or 0
+
+
+def _png_chunk(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+
+def _png_chunks(data: bytes):
+    pos = 8
+    while pos < len(data):
+        (length,) = struct.unpack(">I", data[pos:pos + 4])
+        yield data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+
+
+def _write_apng(image: Image.Image, output: io.BytesIO):
+    """Write an APNG frame by frame from single-frame PNG encodes"""
+    output.write(b"\x89PNG\r\n\x1a\n")
+    actl_pos = None
+    sequence = 0
+    count = 0
+    for frame, duration in _frames(image):
+        encoded = io.BytesIO()
+        frame.save(encoded, "PNG")
+        chunks = list(_png_chunks(encoded.getvalue()))
+        if actl_pos is None:
+            output.write(_png_chunk(b"IHDR", dict(chunks)[b"IHDR"]))
+            # Frame count isn't known until the end; patched below
+            actl_pos = output.tell()
+            output.write(_png_chunk(b"acTL", struct.pack(">II", 0, _plays(image))))
+        # Every frame is the whole canvas and replaces the previous one
+        output.write(_png_chunk(b"fcTL", struct.pack(
+            ">IIIIIHHBB", sequence, frame.width, frame.height, 0, 0, duration, 1000, 0, 0
+        )))
+        sequence += 1
+        for kind, body in chunks:
+            if kind != b"IDAT":
+                continue
+            if count == 0:
+                output.write(_png_chunk(b"IDAT", body))
+            else:
+                output.write(_png_chunk(b"fdAT", struct.pack(">I", sequence) + body))
+                sequence += 1
+        count += 1
+    output.write(_png_chunk(b"IEND", b""))
+    output.seek(actl_pos)
+    output.write(_png_chunk(b"acTL", struct.pack(">II", count, _plays(image))))
+    output.seek(0, io.SEEK_END)
+
+
+def _gif_frame(frame: Image.Image):
+    """Encode one frame as a GIF; returns (color table bits, color table, transparent index, image block)"""
+    encoded = io.BytesIO()
+    frame.save(encoded, "GIF")
+    data = encoded.getvalue()
+    flags = data[10]
+    pos = 13
+    table = b""
+    if flags & 0x80:
+        table = data[pos:pos + (3 << ((flags & 7) + 1))]
+        pos += len(table)
+    transparency = None
+    while data[pos] == 0x21:
+        # Graphic control extension carries the transparent index
+        if data[pos + 1] == 0xF9 and data[pos + 3] & 1:
+            transparency = data[pos + 6]
+        pos += 2
+        while data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    # Image descriptor through the end of the image data, minus the trailer
+    return flags & 7, table, transparency, data[pos:-1]
+
+
+def _write_gif(image: Image.Image, output: io.BytesIO):
+    """Write a GIF frame by frame, each frame with its own color table"""
+    output.write(b"GIF89a" + struct.pack("<HHBBB", image.width, image.height, 0, 0, 0))
+    plays = _plays(image)
+    if plays != 1:
+        output.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", max(plays - 1, 0)) + b"\x00")
+    for frame, duration in _frames(image):
+        bits, table, transparency, block = _gif_frame(frame)
+        # Clear transparent frames so the previous one doesn't show through
+        disposal = 2 if transparency is not None else 1
+        output.write(b"!\xf9\x04" + struct.pack(
+            "<BHBB", disposal << 2 | (transparency is not None), duration // 10, transparency or 0, 0
+        ))
+        descriptor, data = block[:10], block[10:]
+        if table and not descriptor[9] & 0x80:
+            # Move the frame's global table into a local one
+            descriptor = descriptor[:9] + bytes([descriptor[9] | 0x80 | bits])
+            data = table + data
+        output.write(descriptor + data)
+    output.write(b";")
+
+
+def _write_webp(image: Image.Image, output: io.BytesIO):
+    # Pillow's animated WebP writer already seeks through the source one
+    # frame at a time; it only needs the durations up front
+    durations = [duration for _, duration in _frames(image)]
+    image.seek(0)
+    image.save(output, "WEBP", save_all=True, duration=durations, loop=_plays(image))
+
+
+ANIMATION_WRITERS = {'GIF': _write_gif, 'WEBP': _write_webp, 'PNG': _write_apng}
+
+
+def _save(image: Image.Image, pillow_format: str, **params) -> bytes:
+    if pillow_format in OPAQUE_FORMATS and image.mode not in ("RGB", "L"):
+        image = flatten(image)
+    output = io.BytesIO()
+    try:
+        image.save(output, format=pillow_format, **params)
+    except (OSError, ValueError):
+        # Mode the encoder can't write (e.g. CMYK to PNG or GIF)
+        output = io.BytesIO()
+        image.convert("RGBA").save(output, format=pillow_format, **params)
+    return output.getvalue()
+
+
+def convert_image(data: bytes, target_format: str) -> bytes:
+    """Convert image bytes to one of FORMATS (runs in a worker process)"""
+    pillow_format = FORMATS[target_format]
+    if pillow_format in ANIMATED_FORMATS:
+        with open_checked(data) as image:
+            if getattr(image, "is_animated", False):
+                output = io.BytesIO()
+                ANIMATION_WRITERS[pillow_format](image, output)
+                return output.getvalue()
+    with load_image(data, ICO_SIZE if pillow_format == 'ICO' else None) as image:
+        return _save(image, pillow_format)
+
+
+def _search_quality(image: Image.Image, pillow_format: str, max_bytes: int):
+    """Highest quality that fits, by binary search; each quality is encoded at most once"""
+    attempts = {}
+
+    def attempt(quality):
+        if quality not in attempts:
+            attempts[quality] = _save(image, pillow_format, quality=quality)
+        return attempts[quality]
+
+    # Most images either fit at the top or can't fit at all
+    if len(attempt(MAX_QUALITY)) <= max_bytes:
+        return attempts[MAX_QUALITY], f"quality {MAX_QUALITY}", True
+    if len(attempt(MIN_QUALITY)) > max_bytes:
+        return attempts[MIN_QUALITY], f"quality {MIN_QUALITY}", False
+    low, high = MIN_QUALITY, MAX_QUALITY - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(attempt(middle)) <= max_bytes:
+            low = middle
+        else:
+            high = middle - 1
+    return attempts[low], f"quality {low}", True
+
+
+def _fit_encode(image: Image.Image, pillow_format: str, max_bytes: int):
+    """Smallest sensible encode at this size: (data, what was done, whether it fits)"""
+    if pillow_format in QUALITY_FORMATS:
+        return _search_quality(image, pillow_format, max_bytes)
+    if pillow_format == 'PNG':
+        data = _save(image, 'PNG', optimize=True)
+        if len(data) <= max_bytes:
+            return data, "optimized", True
+        source = image if image.mode == "RGB" else image.convert("RGBA")
+        palette = source.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+        data = _save(palette, 'PNG', optimize=True)
+        return data, "256 colors", len(data) <= max_bytes
+    data = _save(image, pillow_format)
+    return data, "", len(data) <= max_bytes
+
+
+def fit_image(data: bytes, target_format: str, max_bytes: int):
+    """Convert and shrink to fit ``max_bytes`` (runs in a worker process).
+
+    Lossy formats get the highest quality that fits, PNG is optimized
+    and then palette-reduced, and if that's not enough the image is
+    scaled down and tried again. Returns (bytes, description of what was
+    done); the result can still be over ``max_bytes`` if nothing worked.
+    """
+    pillow_format = FORMATS[target_format]
+    if pillow_format in ANIMATED_FORMATS:
+        with open_checked(data) as image:
+            if getattr(image, "is_animated", False):
+                # Animations are kept whole rather than searched
+                return convert_image(data, target_format), "all frames kept"
+    with load_image(data, ICO_SIZE if pillow_format == 'ICO' else None) as image:
+        scaled = image
+        encoded, detail, fits = _fit_encode(scaled, pillow_format, max_bytes)
+        for _ in range(MAX_DOWNSCALES):
+            if fits:
+                break
+            # Encoded size roughly follows the pixel count. Aim for the
+            # smallest encode to just fit so the quality search has room
+            ratio = min(0.9, (max_bytes / len(encoded)) ** 0.5)
+            size = (max(1, int(scaled.width * ratio)), max(1, int(scaled.height * ratio)))
+            scaled = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            encoded, detail, fits = _fit_encode(scaled, pillow_format, max_bytes)
+        notes = [detail] if detail else []
+        if scaled is not image:
+            notes.append(f"scaled to {scaled.width}x{scaled.height}")
+    return encoded, ", ".join(notes)
+
+
+async def convert(data: bytes, target_format: str) -> io.BytesIO:
+    """Convert in a worker process and return the result as a buffer ready to send"""
+    return io.BytesIO(await run_in_pool(convert_image, data, target_format))
+
+
+async def fit(data: bytes, target_format: str, max_bytes: int):
+    """Like convert, shrinking the result to fit ``max_bytes``; returns (buffer, description)"""
+    encoded, detail = await run_in_pool(fit_image, data, target_format, max_bytes)
+    return io.BytesIO(encoded), detail
+
+
+class ConvertBatch:
+    """Converts many images into one ZIP, as they're uploaded.
+
+    Each image takes one of ``concurrency`` slots from the start of its
+    download until its result is in the ZIP, so memory depends on the
+    concurrency, not on how many images are in the batch. Results are
+    added in the order they finish.
+    """
+
+    def __init__(self, target_format: str, limit_bytes: int, max_bytes: int = None,
+                 concurrency: int = BATCH_CONCURRENCY):
+        self.target_format = target_format
+        self.limit_bytes = limit_bytes
+        self.max_bytes = max_bytes
+        self.skipped = []
+        self.converted = 0
+        self._buffer = io.BytesIO()
+        compression = zipfile.ZIP_STORED if FORMATS[target_format] in STORED_FORMATS else zipfile.ZIP_DEFLATED
+        self._zip = zipfile.ZipFile(self._buffer, "w", compression)
+        self._names = set()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = []
+
+    @property
+    def added(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def too_large(self) -> bool:
+        return self._buffer.tell() > self.limit_bytes
+
+    def add(self, name: str, fetch) -> bool:
+        """Start converting an image; ``fetch`` is a coroutine function returning its bytes.
+
+        Returns False if the ZIP is already over the size limit.
+        """
+        if self.too_large:
+            return False
+        self._tasks.append(asyncio.create_task(self._convert(name, fetch)))
+        return True
+
+    def _unique_name(self, name: str) -> str:
+        stem = os.path.splitext(os.path.basename(name))[0] or "image"
+        candidate = f"{stem}.{self.target_format}"
+        number = 1
+        while candidate in self._names:
+            number += 1
+            candidate = f"{stem}_{number}.{self.target_format}"
+        self._names.add(candidate)
+        return candidate
+
+    async def _convert(self, name: str, fetch):
+        async with self._slots:
+            try:
+                data = await fetch()
+                if self.max_bytes:
+                    output, _ = await fit(data, self.target_format, self.max_bytes)
+                else:
+                    output = await convert(data, self.target_format)
+            except Exception as e:
+                print(f"Error converting {name}: {e}")
+                self.skipped.append(name)
+                return
+            if self.too_large:
+                self.skipped.append(name)
+                return
+            self._zip.writestr(self._unique_name(name), output.getvalue())
+            self.converted += 1
+
+    async def finish(self):
+        """Wait for every conversion and return the ZIP bytes, or None if nothing converted"""
+        await asyncio.gather(*self._tasks)
+        self._zip.close()
+        return self._buffer.getvalue() if self.converted else None
+
+    def close(self):
+        """Abandon the batch, stopping any work still running"""
+        for task in self._tasks:
+            task.cancel()
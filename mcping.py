@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import re
+import struct
+import time
+import ipaddress
+import dns.asyncresolver
+import dns.exception
+
+JAVA_DEFAULT_PORT = 25565
+BEDROCK_DEFAULT_PORT = 19132
+PING_TIMEOUT = 5  # seconds
+# Status JSON with a favicon is well under this; anything bigger is garbage
+MAX_PACKET_LENGTH = 1024 * 1024
+
+# Protocol -1 asks the server to answer regardless of our version
+JAVA_STATUS_PROTOCOL = -1
+# Fixed magic that marks RakNet offline messages
+RAKNET_MAGIC = bytes.fromhex("00ffff00fefefefefdfdfdfd12345678")
+RAKNET_UNCONNECTED_PING = 0x01
+RAKNET_UNCONNECTED_PONG = 0x1C
+
+FORMATTING_CODES = re.compile(r"§.")
+
+
+class PingError(Exception):
+    pass
+
+
+# What a closed stream, a short or oddly shaped reply can raise while we parse it
+MALFORMED_RESPONSE = (
+    asyncio.IncompleteReadError, struct.error, ValueError, AttributeError, TypeError, KeyError, IndexError
+)
+
+
+def _varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _varint(len(data)) + data
+
+
+def _packet(packet_id: int, payload: bytes = b"") -> bytes:
+    body = _varint(packet_id) + payload
+    return _varint(len(body)) + body
+
+
+def _read_varint_from(data: bytes, offset: int):
+    value = 0
+    for shift in range(0, 35, 7):
+        if offset >= len(data):
+            raise PingError("Truncated VarInt")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, offset
+    raise PingError("VarInt too long")
+
+
+async def _read_varint(reader: asyncio.StreamReader) -> int:
+    value = 0
+    for shift in range(0, 35, 7):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value
+    raise PingError("VarInt too long")
+
+
+async def _read_packet(reader: asyncio.StreamReader):
+    length = await _read_varint(reader)
+    if not 0 < length <= MAX_PACKET_LENGTH:
+        raise PingError(f"Bad packet length {length}")
+    data = await reader.readexactly(length)
+    packet_id, offset = _read_varint_from(data, 0)
+    return packet_id, data[offset:]
+
+
+def _flatten_chat(component) -> str:
+    """Plain text of a chat component (string, list or {"text", "extra"} dict)"""
+    if isinstance(component, str):
+        return component
+    if isinstance(component, list):
+        return "".join(_flatten_chat(part) for part in component)
+    if isinstance(component, dict):
+        return component.get("text", "") + "".join(_flatten_chat(part) for part in component.get("extra", []))
+    return ""
+
+
+def _clean_motd(text: str) -> list:
+    return [line.strip() for line in FORMATTING_CODES.sub("", text).split("\n")]
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+async def resolve_java(host: str, port: int = None):
+    """Apply the _minecraft._tcp SRV record when no port was given.
+
+    Returns (host, port, srv_used).
+    """
+    if port is not None or _is_ip(host):
+        return host, port or JAVA_DEFAULT_PORT, False
+    try:
+        answers = await dns.asyncresolver.resolve(f"_minecraft._tcp.{host}", "SRV", lifetime=PING_TIMEOUT)
+    except (dns.exception.DNSException, OSError):
+        return host, JAVA_DEFAULT_PORT, False
+    record = min(answers, key=lambda r: (r.priority, -r.weight))
+    return str(record.target).rstrip("."), record.port, True
+
+
+async def ping_java(host: str, port: int = None, timeout: float = PING_TIMEOUT) -> dict:
+    """Java Edition Server List Ping (handshake, status, ping/pong).
+
+    Returns a dict shaped like the mcsrvstat.us API response, with the
+    ping/pong round trip in "latency" (ms).
+    """
+    target, target_port, srv = await resolve_java(host, port)
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(target, target_port), timeout)
+    try:
+        async def exchange():
+            handshake = (
+                _varint(JAVA_STATUS_PROTOCOL)
+                + _string(host)
+                + struct.pack(">H", target_port)
+                + _varint(1)  # next state: status
+            )
+            writer.write(_packet(0x00, handshake) + _packet(0x00))
+            await writer.drain()
+
+            packet_id, payload = await _read_packet(reader)
+            if packet_id != 0x00:
+                raise PingError(f"Unexpected status packet {packet_id}")
+            length, offset = _read_varint_from(payload, 0)
+            status = json.loads(payload[offset:offset + length].decode("utf-8"))
+
+            token = int(time.time() * 1000)
+            start = time.perf_counter()
+            writer.write(_packet(0x01, struct.pack(">q", token)))
+            await writer.drain()
+            packet_id, payload = await _read_packet(reader)
+            latency = (time.perf_counter() - start) * 1000
+            if packet_id != 0x01 or struct.unpack(">q", payload[:8])[0] != token:
+                raise PingError("Bad pong")
+            return status, latency
+
+        status, latency = await asyncio.wait_for(exchange(), timeout)
+        return _java_result(status, latency, host, target, target_port, srv)
+    except MALFORMED_RESPONSE as e:
+        raise PingError(f"Malformed status response: {e!r}") from e
+    finally:
+        writer.close()
+
+
+def _java_result(status, latency: float, host: str, target: str, target_port: int, srv: bool) -> dict:
+    if not isinstance(status, dict):
+        raise PingError("Status response is not an object")
+    players = status.get("players", {})
+    version = status.get("version", {})
+    motd = _flatten_chat(status.get("description", ""))
+    result = {
+        "online": True,
+        "hostname": host,
+        "ip": target,
+        "port": target_port,
+        "srv": srv,
+        "version": FORMATTING_CODES.sub("", version.get("name", "Unknown")),
+        "protocol": {"version": version.get("protocol")},
+        "players": {
+            "online": players.get("online", 0),
+            "max": players.get("max", 0),
+            "list": [{"name": p.get("name"), "uuid": p.get("id")} for p in players.get("sample") or []]
+        },
+        "motd": {"raw": [motd], "clean": _clean_motd(motd)},
+        "latency": latency
+    }
+    if status.get("favicon"):
+        result["icon"] = status["favicon"]
+    return result
+
+
+class _BedrockPingProtocol(asyncio.DatagramProtocol):
+    def __init__(self, on_pong: asyncio.Future):
+        self.on_pong = on_pong
+
+    def datagram_received(self, data, addr):
+        if not self.on_pong.done() and data[:1] == bytes([RAKNET_UNCONNECTED_PONG]):
+            self.on_pong.set_result(data)
+
+    def error_received(self, exc):
+        if not self.on_pong.done():
+            self.on_pong.set_exception(exc)
+
+
+async def ping_bedrock(host: str, port: int = None, timeout: float = PING_TIMEOUT) -> dict:
+    """Bedrock Edition RakNet unconnected ping.
+
+    Returns a dict shaped like the mcsrvstat.us bedrock API response, with
+    the ping round trip in "latency" (ms).
+    """
+    port = port or BEDROCK_DEFAULT_PORT
+    loop = asyncio.get_running_loop()
+    on_pong = loop.create_future()
+    transport, _ = await asyncio.wait_for(
+        loop.create_datagram_endpoint(lambda: _BedrockPingProtocol(on_pong), remote_addr=(host, port)),
+        timeout
+    )
+    try:
+        token = int(time.time() * 1000)
+        client_guid = struct.unpack(">q", os.urandom(8))[0]
+        start = time.perf_counter()
+        transport.sendto(
+            bytes([RAKNET_UNCONNECTED_PING]) + struct.pack(">q", token) + RAKNET_MAGIC + struct.pack(">q", client_guid)
+        )
+        data = await asyncio.wait_for(on_pong, timeout)
+        latency = (time.perf_counter() - start) * 1000
+    finally:
+        transport.close()
+
+    try:
+        return _bedrock_result(data, latency, host, port)
+    except MALFORMED_RESPONSE as e:
+        raise PingError(f"Malformed unconnected pong: {e!r}") from e
+
+
+def _bedrock_result(data: bytes, latency: float, host: str, port: int) -> dict:
+    # id(1) + time(8) + server guid(8) + magic(16) + length(2) + server info
+    if len(data) < 35 or data[17:33] != RAKNET_MAGIC:
+        raise PingError("Malformed unconnected pong")
+    (length,) = struct.unpack(">H", data[33:35])
+    fields = data[35:35 + length].decode("utf-8", errors="replace").split(";")
+    fields += [""] * (9 - len(fields))
+
+    def to_int(value):
+        try:
+            return int(value)
+        except ValueError:
+            return 0
+
+    motd = "\n".join(line for line in (fields[1], fields[7]) if line)
+    return {
+        "online": True,
+        "hostname": host,
+        "port": port,
+        "version": fields[3] or "Unknown",
+        "protocol": {"version": to_int(fields[2])},
+        "players": {"online": to_int(fields[4]), "max": to_int(fields[5])},
+        "motd": {"raw": [motd], "clean": _clean_motd(motd)},
+        "gamemode": fields[8],
+        "latency": latency
+    }
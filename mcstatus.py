@@ -0,0 +1,141 @@
+import asyncio
+import time
+import aiohttp
+import dns.exception
+from cache import TTLCache
+from mcping import ping_java, ping_bedrock, PingError
+
+MCSRVSTAT_API = "https://api.mcsrvstat.us"
+STATUS_TTL = 60  # seconds
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=8)
+NATIVE_TIMEOUT = 4  # seconds before giving up on a native Java ping
+# RakNet is one UDP round trip, and hosts that drop UDP never answer at all
+BEDROCK_TIMEOUT = 1.5  # seconds
+# The API is asked as well once a native ping has been silent this long;
+# whichever answers first wins
+HEDGE_DELAY = 0.3  # seconds
+NATIVE_ERRORS = (OSError, asyncio.TimeoutError, PingError, ValueError, dns.exception.DNSException)
+
+
+def _normalize(data: dict) -> dict:
+    """Flatten the parts of a status response the bot reads.
+
+    The v3 API nests the SRV flag under "debug" and lists players as
+    {"name", "uuid"} objects; native pings use the same player shape.
+    """
+    if "srv" not in data:
+        data["srv"] = data.get("debug", {}).get("srv", False)
+    players = data.get("players")
+    if players and players.get("list"):
+        players["list"] = [p.get("name", "") if isinstance(p, dict) else p for p in players["list"]]
+    return data
+
+
+def normalize_address(ip: str, port: str = None) -> str:
+    """Canonical cache key for a server address"""
+    host = ip.strip().lower().rstrip('.')
+    return f"{host}:{port.strip()}" if port and port.strip() else host
+
+
+class MinecraftStatus:
+    """Java and Bedrock status lookups with a TTL cache and request coalescing.
+
+    Servers are pinged directly (Server List Ping / RakNet) first; the
+    mcsrvstat.us API is asked too when a native ping fails or is slow
+    to answer.
+    """
+
+    def __init__(self, http_client, native: bool = True):
+        self.http = http_client
+        self.native = native
+        self.cache = TTLCache(STATUS_TTL, maxsize=1000)
+        self._inflight = {}
+
+    async def lookup(self, ip: str, port: str = None) -> dict:
+        """Return the status of both editions for a server.
+
+        The result has "java" and "bedrock" data dicts (mcsrvstat.us shape),
+        per-edition "latency" in ms, per-edition "path" ("native" or "api"),
+        "checked_at" as a unix timestamp, and "source": "cache" when served
+        from the cache, "live" otherwise.
+        """
+        address = normalize_address(ip, port)
+        cached = self.cache.get(address)
+        if cached is not None:
+            return {**cached, "source": "cache"}
+
+        # Concurrent lookups of the same server share one upstream probe
+        task = self._inflight.get(address)
+        if task is None:
+            task = asyncio.create_task(self._probe(address, ip.strip(), port))
+            self._inflight[address] = task
+            task.add_done_callback(lambda _: self._inflight.pop(address, None))
+        # Shield so one caller giving up doesn't cancel the probe for the rest
+        return await asyncio.shield(task)
+
+    async def _probe(self, address: str, host: str, port: str = None) -> dict:
+        port = int(port) if port and port.strip().isdigit() else None
+        (java, java_ms, java_path), (bedrock, bedrock_ms, bedrock_path) = await asyncio.gather(
+            self._edition(ping_java, host, port, NATIVE_TIMEOUT, f"{MCSRVSTAT_API}/3/{address}"),
+            self._edition(ping_bedrock, host, port, BEDROCK_TIMEOUT, f"{MCSRVSTAT_API}/bedrock/3/{address}")
+        )
+        result = {
+            "address": address,
+            "java": java,
+            "bedrock": bedrock,
+            "latency": {"java": java_ms, "bedrock": bedrock_ms},
+            "path": {"java": java_path, "bedrock": bedrock_path},
+            "checked_at": time.time()
+        }
+        if "error" in java and "error" in bedrock:
+            raise RuntimeError(f"Both status queries failed: {java['error']} / {bedrock['error']}")
+        # Don't remember a half-failed probe for the full TTL
+        if "error" not in java and "error" not in bedrock:
+            self.cache.set(address, result)
+        return {**result, "source": "live"}
+
+    async def _edition(self, ping, host: str, port: int, timeout: float, api_url: str):
+        """Ping one edition natively, hedged with the API; returns (data, ms, path)"""
+        if not self.native:
+            data, ms = await self._query(api_url)
+            return _normalize(data), ms, "api"
+
+        native = asyncio.create_task(ping(host, port, timeout=timeout))
+        api = None
+        pending = {native}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=None if api else HEDGE_DELAY, return_when=asyncio.FIRST_COMPLETED
+                )
+                if native in done:
+                    try:
+                        data = native.result()
+                        return _normalize(data), data["latency"], "native"
+                    except NATIVE_ERRORS as e:
+                        # Closed port, firewall or a proxy that only the API can see
+                        print(f"Native {ping.__name__} failed for {host}: {e!r}, using API")
+                if api in done:
+                    data, ms = api.result()
+                    # An API error only counts once the native ping has failed too
+                    if "error" not in data or not pending:
+                        return _normalize(data), ms, "api"
+                if api is None:
+                    api = asyncio.create_task(self._query(api_url))
+                    pending.add(api)
+            # Native ping failed after an API error
+            data, ms = api.result()
+            return _normalize(data), ms, "api"
+        finally:
+            for task in (native, api):
+                if task is not None:
+                    task.cancel()
+
+    async def _query(self, url: str):
+        start = time.perf_counter()
+        try:
+            async with self.http.get(url, timeout=PROBE_TIMEOUT) as response:
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            data = {"online": False, "error": str(e) or type(e).__name__}
+        return data, (time.perf_counter() - start) * 1000
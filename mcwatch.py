@@ -0,0 +1,133 @@
+import asyncio
+import random
+import time
+
+# Each server is polled roughly this often, spread by +/- WATCH_JITTER so a
+# large watchlist doesn't probe everything in the same instant
+WATCH_INTERVAL = 120  # seconds
+WATCH_JITTER = 0.25
+# Most probes in flight at once, however many servers are due
+WATCH_CONCURRENCY = 10
+# Longest the scheduler sleeps, so newly added watches are picked up quickly
+WATCH_TICK = 5  # seconds
+
+
+def snapshot(status: dict) -> dict:
+    """The parts of a status lookup that alerts are based on"""
+    java = status['java']
+    bedrock = status['bedrock']
+    return {
+        "java_online": bool(java.get('online')),
+        "bedrock_online": bool(bedrock.get('online')),
+        "players": java.get('players', {}).get('online', 0) + bedrock.get('players', {}).get('online', 0),
+        # Per edition, so a server running both doesn't look like it changed
+        # version whenever one of them drops out
+        "java_version": java.get('version') if java.get('online') else None,
+        "bedrock_version": bedrock.get('version') if bedrock.get('online') else None
+    }
+
+
+def diff_status(old: dict, new: dict, player_threshold: int = None) -> list:
+    """Human-readable changes between two snapshots, empty when nothing changed"""
+    changes = []
+    for edition, key in (("Java", "java_online"), ("Bedrock", "bedrock_online")):
+        if old[key] != new[key]:
+            changes.append(f"{edition} went {'🟢 online' if new[key] else '🔴 offline'}")
+    if player_threshold is not None:
+        if old['players'] < player_threshold <= new['players']:
+            changes.append(f"Players reached {new['players']} (threshold {player_threshold})")
+        elif new['players'] < player_threshold <= old['players']:
+            changes.append(f"Players dropped to {new['players']} (threshold {player_threshold})")
+    for edition, key in (("Java", "java_version"), ("Bedrock", "bedrock_version")):
+        if old[key] and new[key] and old[key] != new[key]:
+            changes.append(f"{edition} version changed: `{old[key]}` → `{new[key]}`")
+    return changes
+
+
+class MinecraftWatcher:
+    """Polls every watched server from a single scheduler task.
+
+    Each due check runs as its own task, so a slow server never holds up
+    the schedule; the semaphore caps how many probe at once. The last
+    snapshot per watch is kept in memory and ``notify(watch, changes,
+    status)`` is only awaited when something changed. The first poll of
+    a watch just records a baseline.
+    """
+
+    def __init__(self, mc_status, notify):
+        self.mc_status = mc_status
+        self.notify = notify
+        self.watches = {}
+        self.last = {}
+        self._due = {}
+        self._semaphore = asyncio.Semaphore(WATCH_CONCURRENCY)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._checks = {}
+
+    def start(self, watches: list):
+        for watch in watches:
+            self.add(watch)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = list(self._checks.values())
+        if self._task:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def add(self, watch: dict):
+        self.watches[watch['id']] = watch
+        # Stagger the first polls across one interval
+        self._due[watch['id']] = time.monotonic() + random.uniform(0, WATCH_TICK if self._task else WATCH_INTERVAL)
+        self._wakeup.set()
+
+    def remove(self, watch_id: int):
+        self.watches.pop(watch_id, None)
+        self.last.pop(watch_id, None)
+        self._due.pop(watch_id, None)
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            due = [watch_id for watch_id, at in self._due.items() if at <= now]
+            for watch_id in due:
+                self._due[watch_id] = now + WATCH_INTERVAL * random.uniform(1 - WATCH_JITTER, 1 + WATCH_JITTER)
+                # A probe still running from last time counts for this one
+                if watch_id not in self._checks:
+                    task = asyncio.create_task(self._check(self.watches[watch_id]))
+                    self._checks[watch_id] = task
+                    task.add_done_callback(lambda _, watch_id=watch_id: self._checks.pop(watch_id, None))
+
+            next_due = min(self._due.values(), default=now + WATCH_TICK)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0, min(next_due - time.monotonic(), WATCH_TICK)))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self, watch: dict):
+        async with self._semaphore:
+            try:
+                port = watch.get('port')
+                status = await self.mc_status.lookup(watch['ip'], str(port) if port else None)
+            except Exception as e:
+                # Both editions unreachable, including the API: keep the last
+                # known state rather than guessing
+                print(f"Watch {watch['id']} ({watch['ip']}) probe failed: {e}")
+                return
+        if watch['id'] not in self.watches:
+            return
+        current = snapshot(status)
+        previous = self.last.get(watch['id'])
+        self.last[watch['id']] = current
+        if previous is None:
+            return
+        changes = diff_status(previous, current, watch.get('player_threshold'))
+        if changes:
+            try:
+                await self.notify(watch, changes, status)
+            except Exception as e:
+                print(f"Error sending watch alert for {watch['ip']}: {e}")
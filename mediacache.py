@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "media_cache")
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+INDEX_FILE = "index.json"
+
+
+def media_key(info: dict, kind: str, start_time: int = None, end_time: int = None, profile: str = "") -> str:
+    """Cache key for one rendition of a video: source, format, clip range and encode profile"""
+    source = f"{info.get('extractor_key', '')}:{info['id']}"
+    clip = f"{start_time}-{end_time}" if start_time is not None and end_time is not None else "full"
+    return hashlib.sha256(f"{source}|{kind}|{clip}|{profile}".encode()).hexdigest()[:32]
+
+
+class MediaCache:
+    """Disk cache of finished media files, evicted least recently used first.
+
+    Each entry is a file under ``root`` plus, once known, the link it was
+    shared under (e.g. the Telegram post), so a repeat request can skip
+    both the download and the upload. The index is a small JSON file
+    next to the files. Entries are never evicted while ``pinned``.
+    """
+
+    def __init__(self, root: str = MEDIA_CACHE_DIR, max_bytes: int = MEDIA_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._entries = self._load_index()
+        self._pins = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _load_index(self) -> dict:
+        try:
+            with open(os.path.join(self.root, INDEX_FILE)) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Forget entries whose file was removed behind our back
+        return {key: entry for key, entry in entries.items() if os.path.exists(os.path.join(self.root, entry['file']))}
+
+    def _save_index(self):
+        # Caller holds self._lock
+        path = os.path.join(self.root, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self._entries, f)
+        os.replace(path + ".tmp", path)
+
+    def get(self, key: str):
+        """Return {"path", "name", "size", "link"} for a cached rendition, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            path = os.path.join(self.root, entry['file']) if entry else None
+            if entry is None or not os.path.exists(path):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            # Only updated in memory; the next put or set_link writes it out,
+            # so a hit costs no disk write
+            entry['last_used'] = time.time()
+            self.hits += 1
+            return {"path": path, "name": entry['name'], "size": entry['size'], "link": entry.get('link')}
+
+    async def put(self, key: str, source_path: str, name: str = None) -> str:
+        """Move a finished file into the cache and return its new path"""
+        return await asyncio.to_thread(self._put, key, source_path, name)
+
+    def _put(self, key: str, source_path: str, name: str = None) -> str:
+        ext = os.path.splitext(source_path)[1]
+        file = f"{key}{ext}"
+        path = os.path.join(self.root, file)
+        # Usually a copy from another filesystem; write it under a temporary
+        # name so anyone still reading an earlier copy never sees half a file
+        shutil.move(source_path, path + ".part")
+        os.replace(path + ".part", path)
+        with self._lock:
+            self._entries[key] = {
+                "file": file,
+                "name": name or os.path.basename(source_path),
+                "size": os.path.getsize(path),
+                "last_used": time.time()
+            }
+            self._evict(keep=key)
+            self._save_index()
+        return path
+
+    async def set_link(self, key: str, link: str):
+        with self._lock:
+            if key not in self._entries:
+                return
+            self._entries[key]['link'] = link
+        await asyncio.to_thread(self._save_index_locked)
+
+    def _save_index_locked(self):
+        with self._lock:
+            self._save_index()
+
+    @contextmanager
+    def pinned(self, key: str):
+        """Keep an entry's file from being evicted while it's in use"""
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pins[key] -= 1
+                if not self._pins[key]:
+                    del self._pins[key]
+
+    def _evict(self, keep: str):
+        total = sum(entry['size'] for entry in self._entries.values())
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep or key in self._pins:
+                continue
+            try:
+                os.remove(os.path.join(self.root, entry['file']))
+            except OSError:
+                pass
+            total -= entry['size']
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(entry['size'] for entry in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,257 @@
+import asyncio
+import copy
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import yt_dlp
+from transcode import ENCODE_THREADS
+
+# yt-dlp downloads and metadata lookups are blocking, so they run on their
+# own thread pools. Downloads are few and heavy, lookups many and light.
+MEDIA_MAX_DOWNLOADS = int(os.getenv("MEDIA_MAX_DOWNLOADS", 2))
+MEDIA_MAX_EXTRACTS = int(os.getenv("MEDIA_MAX_EXTRACTS", 4))
+# Jobs accepted at once, running or waiting for a download slot
+MEDIA_MAX_PENDING = int(os.getenv("MEDIA_MAX_PENDING", 8))
+# x264 encodes at once, so all of them together use at most every core
+MEDIA_MAX_ENCODES = int(os.getenv("MEDIA_MAX_ENCODES", max(1, (os.cpu_count() or 2) // ENCODE_THREADS)))
+# Progress messages are edited at most this often, however fast hooks fire
+PROGRESS_EDIT_INTERVAL = 2  # seconds
+PROGRESS_BAR_WIDTH = 12
+
+
+class JobCancelled(yt_dlp.utils.DownloadCancelled):
+    """Raised inside yt-dlp hooks; yt-dlp lets this one propagate untouched"""
+    msg = "The download was cancelled by the user"
+
+
+class MediaJob:
+    """One user's download, cancellable from the event loop.
+
+    Worker threads notice a cancel through ``progress_hook`` (passed to
+    yt-dlp) or ``check()``; ffmpeg processes started via ``run_process``
+    are killed outright.
+
+    The hooks and ffmpeg's ``-progress`` output also update a small
+    progress model (stage, fraction, detail) that ``start_reporting``
+    renders into the user's status message.
+    """
+
+    def __init__(self, job_id: int, owner_id: int, description: str):
+        self.id = job_id
+        self.owner_id = owner_id
+        self.description = description
+        self._cancel = threading.Event()
+        self._processes = set()
+        self.stage = "Queued"
+        self.fraction = None
+        self.detail = ""
+        # Bumped on every change so the reporter knows when to edit
+        self.version = 0
+        self._reporter = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+        for process in list(self._processes):
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def set_progress(self, stage: str, fraction: float = None, detail: str = ""):
+        self.stage = stage
+        self.fraction = fraction
+        self.detail = detail
+        self.version += 1
+
+    def render(self) -> str:
+        line = f"⏳ {self.stage}"
+        if self.fraction is not None:
+            filled = round(self.fraction * PROGRESS_BAR_WIDTH)
+            line += f" {self.fraction:.0%}\n`{'█' * filled}{'░' * (PROGRESS_BAR_WIDTH - filled)}`"
+        if self.detail:
+            line += f" {self.detail}"
+        return line
+
+    def progress_hook(self, progress: dict):
+        # yt-dlp calls this from the worker thread on every chunk, and lets
+        # exceptions raised here abort the download
+        self.check()
+        if progress.get('status') == 'downloading':
+            total = progress.get('total_bytes') or progress.get('total_bytes_estimate')
+            if total:
+                fraction = progress.get('downloaded_bytes', 0) / total
+            elif progress.get('fragment_count'):
+                fraction = progress.get('fragment_index', 0) / progress['fragment_count']
+            else:
+                fraction = None
+            details = []
+            if progress.get('speed'):
+                details.append(f"{progress['speed'] / 1024 ** 2:.1f}MiB/s")
+            if progress.get('eta') is not None:
+                eta = int(progress['eta'])
+                details.append(f"ETA {eta // 60}:{eta % 60:02d}")
+            self.set_progress("Downloading", fraction, " • ".join(details))
+        elif progress.get('status') == 'finished':
+            self.set_progress("Download finished")
+
+    def postprocessor_hook(self, progress: dict):
+        self.check()
+        if progress.get('status') == 'started':
+            self.set_progress(f"Processing ({progress.get('postprocessor', 'ffmpeg')})")
+
+    async def run_process(self, *cmd, stage: str = None, duration: float = None):
+        """Run a subprocess that dies with the job; returns (returncode, stdout, stderr).
+
+        With ``duration`` set, the command is expected to write ffmpeg
+        ``-progress pipe:1`` output, which drives the job's progress.
+        """
+        self.check()
+        if stage:
+            self.set_progress(stage, 0.0 if duration else None)
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self._processes.add(process)
+        stderr_task = None
+        try:
+            if duration:
+                # Drain stderr alongside so a chatty ffmpeg can't block on it
+                stderr_task = asyncio.create_task(process.stderr.read())
+                stdout = []
+                async for line in process.stdout:
+                    stdout.append(line)
+                    key, _, value = line.decode(errors="replace").strip().partition("=")
+                    if key == "out_time_us" and value.isdigit():
+                        self.set_progress(stage, min(int(value) / 1e6 / duration, 1.0))
+                stderr = await stderr_task
+                await process.wait()
+                stdout = b"".join(stdout)
+            else:
+                stdout, stderr = await process.communicate()
+        finally:
+            self._processes.discard(process)
+            # Cancelled or failed while reading: don't leave ffmpeg running
+            # or its stderr reader pending
+            if process.returncode is None:
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+            if stderr_task is not None and not stderr_task.done():
+                stderr_task.cancel()
+                await asyncio.gather(stderr_task, return_exceptions=True)
+        self.check()
+        return process.returncode, stdout, stderr
+
+    def start_reporting(self, edit):
+        """Call ``await edit(text)`` with the rendered progress whenever it
+        changed, at most once every PROGRESS_EDIT_INTERVAL seconds"""
+        async def report():
+            shown = self.version
+            while True:
+                await asyncio.sleep(PROGRESS_EDIT_INTERVAL)
+                if self.version == shown or self.cancelled:
+                    continue
+                shown = self.version
+                try:
+                    await edit(self.render())
+                except Exception as e:
+                    # Interaction tokens expire after 15 minutes; keep the job going
+                    print(f"Error updating progress for job {self.id}: {e}")
+
+        self._reporter = asyncio.create_task(report())
+
+    def stop_reporting(self):
+        if self._reporter:
+            self._reporter.cancel()
+            self._reporter = None
+
+
+class MediaJobExecutor:
+    def __init__(self):
+        self._downloads = ThreadPoolExecutor(max_workers=MEDIA_MAX_DOWNLOADS, thread_name_prefix="media")
+        self._extracts = ThreadPoolExecutor(max_workers=MEDIA_MAX_EXTRACTS, thread_name_prefix="media-info")
+        self._ids = itertools.count(1)
+        self.jobs = {}
+        # Taken by transcode.fit_to_size around each re-encode
+        self.encode_slots = asyncio.Semaphore(MEDIA_MAX_ENCODES)
+
+    def new_job(self, owner_id: int, description: str):
+        """Register a job, or return None when the queue is full"""
+        if len(self.jobs) >= MEDIA_MAX_PENDING:
+            return None
+        job = MediaJob(next(self._ids), owner_id, description)
+        self.jobs[job.id] = job
+        return job
+
+    def finish(self, job: MediaJob):
+        self.jobs.pop(job.id, None)
+
+    async def run(self, job: MediaJob, func, *args):
+        """Run blocking download work for a job on the download pool"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._downloads, func, *args)
+        except asyncio.CancelledError:
+            # The thread can't be interrupted, but the next hook call stops it
+            job.cancel()
+            raise
+
+    async def extract_info(self, url: str) -> dict:
+        """Video metadata without downloading anything"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._extracts, extract_info, url)
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            job.cancel()
+        self._downloads.shutdown(wait=False, cancel_futures=True)
+        self._extracts.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_info(url: str) -> dict:
+    with yt_dlp.YoutubeDL() as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def ytdl_download(job: MediaJob, info: dict, options: dict):
+    """Download with yt-dlp in a worker thread; returns (info, filename).
+
+    ``info`` is the metadata already extracted for the video, so only
+    format selection and the download itself run again.
+    """
+    job.check()
+    options = {
+        **options,
+        'progress_hooks': [job.progress_hook],
+        'postprocessor_hooks': [job.postprocessor_hook]
+    }
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+        # Section downloads and postprocessors can change the final path
+        downloads = info.get('requested_downloads') or []
+        if downloads and downloads[-1].get('filepath'):
+            return info, downloads[-1]['filepath']
+        return info, ydl.prepare_filename(info)
+
+
+def clip_options(start_time: int = None, end_time: int = None) -> dict:
+    """yt-dlp options that fetch only the given range, cut on keyframes"""
+    if start_time is None or end_time is None:
+        return {}
+    return {
+        'download_ranges': yt_dlp.utils.download_range_func(None, [(start_time, end_time)]),
+        'force_keyframes_at_cuts': True
+    }
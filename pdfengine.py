@@ -0,0 +1,279 @@
+import asyncio
+import io
+import os
+import struct
+from imageengine import flatten, load_image, run_in_pool
+
+# A4 portrait in points, with the same 10mm margins the FPDF version used
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+PAGE_MARGIN = 28.35
+TRANSCODE_QUALITY = 90
+# Largest pixel size worth keeping for an image that has to be transcoded:
+# the printable area at 300dpi
+PDF_IMAGE_SIZE = (
+    round((PAGE_WIDTH - 2 * PAGE_MARGIN) / 72 * 300),
+    round((PAGE_HEIGHT - 2 * PAGE_MARGIN) / 72 * 300)
+)
+# JPEGs well past that are shrunk too (decoding at reduced scale is cheap)
+# instead of bloating the PDF with pixels nobody can see
+PASSTHROUGH_MAX_PIXELS = 2 * PDF_IMAGE_SIZE[0] * PDF_IMAGE_SIZE[1]
+# Attachments downloaded (or waiting to be written) at once per album
+PDF_FETCH_CONCURRENCY = int(os.getenv("PDF_FETCH_CONCURRENCY", 4))
+
+# Baseline, extended and progressive Huffman JPEGs are valid DCTDecode
+# streams; arithmetic-coded and lossless ones are not
+PASSTHROUGH_SOF = (0xC0, 0xC1, 0xC2)
+OTHER_SOF = (0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)
+COLOR_SPACES = {1: "/DeviceGray", 3: "/DeviceRGB", 4: "/DeviceCMYK"}
+
+
+def _exif_orientation(segment: bytes) -> int:
+    """Orientation tag from an APP1 Exif segment body, 1 if absent"""
+    if not segment.startswith(b"Exif\0\0"):
+        return 1
+    tiff = segment[6:]
+    try:
+        endian = {b"II": "<", b"MM": ">"}[tiff[:2]]
+        (ifd,) = struct.unpack(endian + "I", tiff[4:8])
+        (count,) = struct.unpack(endian + "H", tiff[ifd:ifd + 2])
+        for i in range(count):
+            entry = tiff[ifd + 2 + i * 12: ifd + 14 + i * 12]
+            tag, _, _, value = struct.unpack(endian + "HHIH", entry[:10])
+            if tag == 0x0112:
+                return value
+    except (KeyError, struct.error):
+        pass
+    return 1
+
+
+def jpeg_info(data: bytes):
+    """Read what the PDF needs from a JPEG's headers without decoding it.
+
+    Returns a dict with width, height, components, adobe (inverted CMYK)
+    and orientation, or None if the data can't be embedded as-is.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    info = {"adobe": False, "orientation": 1}
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # Fill byte
+            pos += 1
+            continue
+        (length,) = struct.unpack(">H", data[pos + 2:pos + 4])
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xE1 and segment.startswith(b"Exif\0\0"):
+            # XMP also lives in APP1, often right after the Exif block
+            info["orientation"] = _exif_orientation(segment)
+        elif marker == 0xEE and segment.startswith(b"Adobe"):
+            info["adobe"] = True
+        elif marker in PASSTHROUGH_SOF:
+            precision, height, width, components = struct.unpack(">BHHB", segment[:6])
+            if precision != 8 or components not in COLOR_SPACES or not width or not height:
+                return None
+            info.update(width=width, height=height, components=components)
+            return info
+        elif marker in OTHER_SOF or marker == 0xDA:
+            return None
+        pos += 2 + length
+    return None
+
+
+def transcode_to_jpeg(data: bytes) -> bytes:
+    """Re-encode any Pillow-readable image as an RGB JPEG (runs in a worker process)"""
+    # Nothing beyond print resolution is visible on the page
+    with load_image(data, PDF_IMAGE_SIZE) as image:
+        # Transparency goes onto white paper rather than black
+        flat = flatten(image)
+    output = io.BytesIO()
+    flat.save(output, "JPEG", quality=TRANSCODE_QUALITY)
+    return output.getvalue()
+
+
+class PDFWriter:
+    """Minimal PDF writer with one JPEG per A4 page, built in memory.
+
+    JPEG bytes are embedded verbatim as DCTDecode image streams. Pages are
+    written as they're added, so callers can feed them in as they arrive.
+    """
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.buffer.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.offsets = {}
+        # 1 is the catalog and 2 the page tree, both written by finish()
+        self.next_id = 3
+        self.pages = []
+
+    def _begin(self, obj_id: int):
+        self.offsets[obj_id] = self.buffer.tell()
+        self.buffer.write(f"{obj_id} 0 obj\n".encode())
+
+    def _object(self, obj_id: int, body: str):
+        self._begin(obj_id)
+        self.buffer.write(body.encode() + b"\nendobj\n")
+
+    def _stream(self, obj_id: int, header: str, data: bytes):
+        self._begin(obj_id)
+        self.buffer.write(f"<< {header} /Length {len(data)} >>\nstream\n".encode())
+        self.buffer.write(data)
+        self.buffer.write(b"\nendstream\nendobj\n")
+
+    def add_jpeg(self, data: bytes, info: dict):
+        image_id, content_id, page_id = self.next_id, self.next_id + 1, self.next_id + 2
+        self.next_id += 3
+
+        header = (
+            f"/Type /XObject /Subtype /Image /Width {info['width']} /Height {info['height']} "
+            f"/ColorSpace {COLOR_SPACES[info['components']]} /BitsPerComponent 8 /Filter /DCTDecode"
+        )
+        if info['components'] == 4 and info['adobe']:
+            # Adobe writes CMYK JPEGs inverted
+            header += " /Decode [1 0 1 0 1 0 1 0]"
+        self._stream(image_id, header, data)
+
+        # Fit inside the margins, keeping the aspect ratio of the image as shown
+        rotated = info['orientation'] in (5, 6, 7, 8)
+        shown_w, shown_h = (info['height'], info['width']) if rotated else (info['width'], info['height'])
+        scale = min((PAGE_WIDTH - 2 * PAGE_MARGIN) / shown_w, (PAGE_HEIGHT - 2 * PAGE_MARGIN) / shown_h)
+        w, h = shown_w * scale, shown_h * scale
+        x, y = PAGE_MARGIN, PAGE_HEIGHT - PAGE_MARGIN - h
+        # Map the unit square to the page, applying EXIF rotation; mirrored
+        # orientations are drawn unmirrored
+        matrix = {
+            3: (-w, 0, 0, -h, x + w, y + h),
+            4: (-w, 0, 0, -h, x + w, y + h),
+            5: (0, h, -w, 0, x + w, y),
+            6: (0, -h, w, 0, x, y + h),
+            7: (0, -h, w, 0, x, y + h),
+            8: (0, h, -w, 0, x + w, y),
+        }.get(info['orientation'], (w, 0, 0, h, x, y))
+        content = f"q {' '.join(f'{v:.2f}' for v in matrix)} cm /Im0 Do Q".encode()
+        self._stream(content_id, "", content)
+
+        self._object(
+            page_id,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        self.pages.append(page_id)
+
+    @property
+    def size(self) -> int:
+        return self.buffer.tell()
+
+    def finish(self) -> bytes:
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.pages)
+        self._object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>")
+        self._object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref = self.buffer.tell()
+        self.buffer.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, self.next_id):
+            self.buffer.write(f"{self.offsets[obj_id]:010d} 00000 n \n".encode())
+        self.buffer.write(f"trailer\n<< /Size {self.next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+        return self.buffer.getvalue()
+
+
+async def prepare_image(data: bytes):
+    """Return (jpeg bytes, jpeg_info) ready for PDFWriter.add_jpeg.
+
+    JPEGs up to print resolution pass straight through; anything else is
+    transcoded in the image worker processes.
+    """
+    info = jpeg_info(data)
+    if info is None or info['width'] * info['height'] > PASSTHROUGH_MAX_PIXELS:
+        data = await run_in_pool(transcode_to_jpeg, data)
+        info = jpeg_info(data)
+    return data, info
+
+
+class AlbumPDF:
+    """Builds a PDF while its pages are still being uploaded.
+
+    Each page is fetched and prepared in the background as soon as it's
+    added, and written to the PDF in the order it was added. A page holds
+    one of ``concurrency`` slots from the start of its download until it
+    is written, so only that many images are ever held outside the PDF.
+    """
+
+    def __init__(self, limit_bytes: int, concurrency: int = PDF_FETCH_CONCURRENCY):
+        self.writer = PDFWriter()
+        self.limit_bytes = limit_bytes
+        self.skipped = []
+        self._slots = asyncio.Semaphore(concurrency)
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self._assembler = None
+
+    @property
+    def added(self) -> int:
+        return len(self._tasks)
+
+    @property
+    def too_large(self) -> bool:
+        return self.writer.size > self.limit_bytes
+
+    def add(self, name: str, fetch) -> bool:
+        """Start fetching a page; ``fetch`` is a coroutine function returning the image bytes.
+
+        Returns False if the PDF is already over the size limit.
+        """
+        if self.too_large:
+            return False
+        if self._assembler is None:
+            self._assembler = asyncio.create_task(self._assemble())
+        # Tasks queue on the semaphore in the order they're created, so the
+        # next page to be written always has a slot
+        task = asyncio.create_task(self._prepare(fetch))
+        self._tasks.append(task)
+        self._queue.put_nowait((name, task))
+        return True
+
+    async def _prepare(self, fetch):
+        await self._slots.acquire()
+        try:
+            return await prepare_image(await fetch())
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _assemble(self):
+        while True:
+            name, task = await self._queue.get()
+            if task is None:
+                return
+            try:
+                data, info = await task
+            except Exception as e:
+                print(f"Error processing image {name}: {e}")
+                self.skipped.append(name)
+                continue
+            try:
+                if self.too_large:
+                    self.skipped.append(name)
+                else:
+                    self.writer.add_jpeg(data, info)
+            finally:
+                self._slots.release()
+
+    async def finish(self):
+        """Wait for the remaining pages and return the PDF bytes, or None if no page could be read"""
+        if self._assembler is None:
+            return None
+        self._queue.put_nowait((None, None))
+        await self._assembler
+        return self.writer.finish() if self.writer.pages else None
+
+    def close(self):
+        """Abandon the album, stopping any downloads still running"""
+        for task in self._tasks:
+            task.cancel()
+        if self._assembler is not None:
+            self._assembler.cancel()
+
@@ -33,7 +33,7 @@ def run_bot():
         while True:
             if process is None:
                 print("\nStarting bot...")
-                process = subprocess.Popen([sys.executable, "bot.py"])
+                process = subprocess.Popen([sys.executable, "start.py"])
                 
                 # Setup file watcher
                 if observer is None:
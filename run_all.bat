@@ -1,4 +1,4 @@
 @echo off
-start python bot.py
+start python start.py
 start python music_bot.py
 pause 
\ No newline at end of file
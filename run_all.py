@@ -4,7 +4,7 @@ import sys
 def run_bots():
     try:
         # Start main bot
-        main_bot = subprocess.Popen([sys.executable, "bot.py"])
+        main_bot = subprocess.Popen([sys.executable, "start.py"])
         
         # Start music bot
         music_bot = subprocess.Popen([sys.executable, "music_bot.py"])
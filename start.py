@@ -0,0 +1,9 @@
+"""Starts the bot.
+
+Use this rather than ``python bot.py``: the image worker processes re-run
+the main script's top level when they start, and this one has none.
+"""
+
+if __name__ == "__main__":
+    import bot
+    bot.main()
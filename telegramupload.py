@@ -0,0 +1,159 @@
+import asyncio
+import os
+import time
+import telegram
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
+
+# Point this at a local mock Bot API server for testing
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org/bot")
+TELEGRAM_UPLOAD_WORKERS = int(os.getenv("TELEGRAM_UPLOAD_WORKERS", 2))
+TELEGRAM_UPLOAD_QUEUE = int(os.getenv("TELEGRAM_UPLOAD_QUEUE", 16))
+UPLOAD_RETRIES = 3
+RETRY_BACKOFF = 2  # seconds, doubled per attempt
+UPLOAD_TIMEOUT = 300  # seconds, a 50MB upload on a slow link
+
+
+class UploadQueueFull(Exception):
+    pass
+
+
+class TelegramUploader:
+    """Long-lived Telegram upload service owned by the bot.
+
+    One Bot and one HTTPX connection pool are reused for every upload.
+    Uploads go through a bounded queue drained by a fixed number of
+    workers, and transient failures are retried with backoff.
+    """
+
+    def __init__(self, token: str, chat_id: str, base_url: str = TELEGRAM_API_BASE,
+                 workers: int = TELEGRAM_UPLOAD_WORKERS, queue_size: int = TELEGRAM_UPLOAD_QUEUE):
+        request = HTTPXRequest(
+            connection_pool_size=workers + 1,
+            connect_timeout=30,
+            read_timeout=UPLOAD_TIMEOUT,
+            write_timeout=UPLOAD_TIMEOUT,
+            # Requests that carry files use this one, not write_timeout
+            media_write_timeout=UPLOAD_TIMEOUT,
+            pool_timeout=UPLOAD_TIMEOUT
+        )
+        # Without a token the bot still runs; uploads just fail with a TelegramError
+        self.bot = telegram.Bot(token, base_url=base_url, request=request) if token else None
+        self.chat_id = chat_id
+        self.worker_count = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._workers = []
+        self._metrics = {"uploads": 0, "failures": 0, "retries": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0}
+
+    async def start(self):
+        if self.bot is None:
+            print("Warning: TELEGRAM_BOT_TOKEN not set, Telegram uploads are disabled")
+            return
+        try:
+            await self.bot.initialize()
+        except Exception as e:
+            # get_me failing shouldn't stop the bot; uploads report their own errors
+            print(f"Error initializing Telegram bot: {e}")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self.bot is not None:
+            await self.bot.shutdown()
+
+    async def upload_video(self, path: str, caption: str = None) -> telegram.Message:
+        """Queue a video for upload and wait for the sent message.
+
+        Raises UploadQueueFull when too many uploads are already waiting.
+        """
+        if self.bot is None:
+            raise TelegramError("Telegram uploads are not configured")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((path, caption, future))
+        except asyncio.QueueFull:
+            raise UploadQueueFull("Too many uploads in progress")
+        return await future
+
+    async def _worker(self):
+        while True:
+            path, caption, future = await self.queue.get()
+            try:
+                # The requester may have given up while this sat in the queue
+                if not future.cancelled():
+                    message = await self._send(path, caption)
+                    if not future.done():
+                        future.set_result(message)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def _send(self, path: str, caption: str = None) -> telegram.Message:
+        # Read off the event loop; Telegram caps bot uploads at 50MB anyway
+        data = await asyncio.to_thread(_read_file, path)
+        start = time.perf_counter()
+        for attempt in range(UPLOAD_RETRIES + 1):
+            try:
+                message = await self.bot.send_video(
+                    chat_id=self.chat_id,
+                    video=data,
+                    filename=os.path.basename(path),
+                    caption=caption,
+                    supports_streaming=True
+                )
+                break
+            except RetryAfter as e:
+                if attempt == UPLOAD_RETRIES:
+                    self._record(start, 0, failed=True)
+                    raise
+                delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            except BadRequest:
+                # A NetworkError subclass, but "chat not found" or "file too large" won't fix itself
+                self._record(start, 0, failed=True)
+                raise
+            except NetworkError:
+                # Includes TimedOut
+                if attempt == UPLOAD_RETRIES:
+                    self._record(start, 0, failed=True)
+                    raise
+                delay = RETRY_BACKOFF * 2 ** attempt
+            except TelegramError:
+                # Forbidden and friends aren't NetworkErrors and fail straight away
+                self._record(start, 0, failed=True)
+                raise
+            self._metrics["retries"] += 1
+            await asyncio.sleep(delay)
+        self._record(start, len(data), failed=False)
+        return message
+
+    def _record(self, start: float, size: int, failed: bool):
+        elapsed = time.perf_counter() - start
+        if failed:
+            self._metrics["failures"] += 1
+            return
+        self._metrics["uploads"] += 1
+        self._metrics["bytes"] += size
+        self._metrics["seconds"] += elapsed
+        self._metrics["max_seconds"] = max(self._metrics["max_seconds"], elapsed)
+
+    def stats(self) -> dict:
+        """Upload counts, queue depth, average/max duration and throughput in MB/s"""
+        m = self._metrics
+        return {
+            "uploads": m["uploads"],
+            "failures": m["failures"],
+            "retries": m["retries"],
+            "queued": self.queue.qsize(),
+            "avg_seconds": m["seconds"] / m["uploads"] if m["uploads"] else 0.0,
+            "max_seconds": m["max_seconds"],
+            "mb_per_second": m["bytes"] / 1024 ** 2 / m["seconds"] if m["seconds"] else 0.0
+        }
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+
+# Bot API upload limit for the Telegram channel videos end up in
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+
+AUDIO_KBPS = 128
+# Keep a little room for container overhead and rate-control overshoot
+SIZE_HEADROOM = 0.95
+MIN_VIDEO_KBPS = 100
+# CPU threads one encode may use; MediaJobExecutor runs only as many
+# encodes at once as fit in the machine's cores
+ENCODE_THREADS = int(os.getenv("ENCODE_THREADS", max(1, (os.cpu_count() or 2) // 2)))
+
+# (minimum video kbps, output height): the more bits per second we can
+# afford, the more lines we keep
+RESOLUTION_LADDER = (
+    (2500, 1080),
+    (1200, 720),
+    (600, 480),
+    (0, 360),
+)
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def plan_encode(duration: float, limit_bytes: int, audio_kbps: int = AUDIO_KBPS) -> dict:
+    """Pick the video bitrate and height that fill ``limit_bytes`` for ``duration`` seconds"""
+    total_kbps = limit_bytes * 8 / 1000 * SIZE_HEADROOM / max(duration, 1)
+    video_kbps = max(int(total_kbps - audio_kbps), MIN_VIDEO_KBPS)
+    height = next(height for min_kbps, height in RESOLUTION_LADDER if video_kbps >= min_kbps)
+    return {
+        "video_kbps": video_kbps,
+        "audio_kbps": audio_kbps,
+        "height": height,
+        "name": f"x264 2-pass {height}p @ {video_kbps} kbps"
+    }
+
+
+async def probe_duration(job, path: str) -> float:
+    returncode, stdout, stderr = await job.run_process(
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        path
+    )
+    try:
+        return float(stdout.decode().strip())
+    except ValueError:
+        raise TranscodeError(f"Could not read duration of {path}: {stderr.decode(errors='replace')[-300:]}")
+
+
+async def _two_pass(job, source: str, output: str, passlog: str, plan: dict, duration: float):
+    common = [
+        'ffmpeg', '-y', '-i', source,
+        # Never upscale: min() keeps smaller sources at their own height
+        '-vf', f"scale=-2:'min({plan['height']},ih)'",
+        '-c:v', 'libx264', '-preset', 'medium',
+        '-b:v', f"{plan['video_kbps']}k",
+        '-threads', str(ENCODE_THREADS),
+        '-passlogfile', passlog
+    ]
+    passes = (
+        common + ['-pass', '1', '-an', '-f', 'mp4', os.devnull],
+        common + ['-pass', '2', '-c:a', 'aac', '-b:a', f"{plan['audio_kbps']}k", '-movflags', '+faststart', output]
+    )
+    for number, cmd in enumerate(passes, 1):
+        returncode, _, stderr = await job.run_process(
+            *cmd[:1], '-progress', 'pipe:1', '-nostats', *cmd[1:],
+            stage=f"Encoding {plan['height']}p, pass {number}/2",
+            duration=duration
+        )
+        if returncode != 0:
+            raise TranscodeError(f"ffmpeg failed: {stderr.decode(errors='replace')[-300:]}")
+
+
+async def fit_to_size(job, source: str, workspace, limit_bytes: int, encode_slots: asyncio.Semaphore) -> dict:
+    """Make ``source`` fit under ``limit_bytes``.
+
+    A file that already fits is left alone (the download is a stream
+    copy, so there's nothing to gain). Otherwise it is re-encoded with
+    two-pass x264 at the bitrate the limit allows, once one of
+    ``encode_slots`` is free. The output and pass logs go in the job's
+    ``workspace``.
+    Returns a report with the output path, the profile used and the
+    encode speed as a multiple of realtime.
+    """
+    size = os.path.getsize(source)
+    if size <= limit_bytes:
+        return {"path": source, "profile": "stream copy", "size": size, "elapsed": 0.0, "speed": None}
+
+    output = workspace.file("encoded.mp4")
+    if output == source:
+        # A video that happens to be titled "encoded"
+        output = workspace.file("encoded-x264.mp4")
+    passlog = workspace.file("ffmpeg2pass")
+    duration = await probe_duration(job, source)
+    plan = plan_encode(duration, limit_bytes)
+    if encode_slots.locked():
+        job.set_progress("Waiting for a free encoder")
+    try:
+        async with encode_slots:
+            start = time.perf_counter()
+            await _two_pass(job, source, output, passlog, plan, duration)
+            # Rate control can overshoot on very short clips; one tighter retry
+            if os.path.getsize(output) > limit_bytes:
+                plan = plan_encode(duration * os.path.getsize(output) / limit_bytes, limit_bytes)
+                await _two_pass(job, source, output, passlog, plan, duration)
+    except BaseException:
+        # Cancelled or failed: don't leave a half-written file behind
+        if os.path.exists(output):
+            os.remove(output)
+        raise
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(output)
+    if size > limit_bytes:
+        raise TranscodeError(f"Encoded file is still {size / 1024 ** 2:.1f}MB")
+    return {
+        "path": output,
+        "profile": plan['name'],
+        "size": size,
+        "elapsed": elapsed,
+        "speed": duration / elapsed if elapsed else None
+    }
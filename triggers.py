@@ -0,0 +1,87 @@
+from collections import deque
+from typing import List, Dict, Optional
+
+NO_MATCH = float("inf")
+
+
+class TriggerMatcher:
+    """Aho-Corasick automaton over one guild's trigger names.
+
+    Matching keeps the behaviour of the original loop in on_message: the
+    first trigger (in list order) whose name appears anywhere in the
+    lowercased message wins. Mention triggers ("@name") also fire when the
+    name appears in one of the mentioned members' usernames.
+    """
+
+    def __init__(self, triggers: List[Dict]):
+        self.triggers = list(triggers)
+        self._goto = [{}]
+        self._fail = [0]
+        # Lowest trigger index that ends at each state (after following
+        # failure links), for all triggers and for mention triggers only
+        self._best = [NO_MATCH]
+        self._best_mention = [NO_MATCH]
+        self.has_mentions = False
+
+        for index, trigger in enumerate(self.triggers):
+            name = trigger['name'].lower()
+            is_mention = name.startswith('@')
+            state = self._insert(name[1:] if is_mention else name)
+            self._best[state] = min(self._best[state], index)
+            if is_mention:
+                self.has_mentions = True
+                self._best_mention[state] = min(self._best_mention[state], index)
+
+        self._link()
+
+    def _insert(self, pattern: str) -> int:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(NO_MATCH)
+                self._best_mention.append(NO_MATCH)
+                self._goto[state][char] = next_state
+            state = next_state
+        return state
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._best[child] = min(self._best[child], self._best[self._fail[child]])
+                self._best_mention[child] = min(self._best_mention[child], self._best_mention[self._fail[child]])
+                queue.append(child)
+
+    def _scan(self, text: str, best: list, limit=NO_MATCH):
+        goto = self._goto
+        fail = self._fail
+        found = min(limit, best[0])
+        state = 0
+        for char in text:
+            if found == 0:
+                break
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if best[state] < found:
+                found = best[state]
+        return found
+
+    def match(self, content: str, mention_names: List[str] = ()) -> Optional[Dict]:
+        """Return the first trigger fired by a message, or None"""
+        if not self.triggers:
+            return None
+        found = self._scan(content.lower(), self._best)
+        if self.has_mentions:
+            for name in mention_names:
+                found = self._scan(name.lower(), self._best_mention, found)
+        return self.triggers[found] if found != NO_MATCH else None
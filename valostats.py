@@ -0,0 +1,209 @@
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from cache import TTLCache
+
+MATCH_DB = os.getenv("MATCH_DB", "matches.db")
+
+# Stored-match pages requested per sync, and how many to walk at most
+SYNC_PAGE_SIZE = 25
+SYNC_MAX_PAGES = 20
+# Don't ask the API for new matches more often than this per player
+SYNC_INTERVAL = 300  # seconds
+ROLLING_WINDOW = 20
+
+COLUMNS = (
+    "puuid", "match_id", "started_at", "map", "mode", "agent",
+    "kills", "deaths", "assists", "head", "body", "leg", "score", "rounds", "won"
+)
+
+
+class MatchStore:
+    """Local per-player match history, keyed by match ID.
+
+    Only the numbers needed for aggregates are kept, one row per player
+    per match. sqlite runs on its own single worker thread so the event
+    loop never waits on disk.
+    """
+
+    def __init__(self, path: str = MATCH_DB):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="matchstore")
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS player_matches ("
+            "puuid TEXT, match_id TEXT, started_at TEXT, map TEXT, mode TEXT, agent TEXT, "
+            "kills INTEGER, deaths INTEGER, assists INTEGER, head INTEGER, body INTEGER, leg INTEGER, "
+            "score INTEGER, rounds INTEGER, won INTEGER, PRIMARY KEY (puuid, match_id))"
+        )
+        self._conn.commit()
+        self._synced = TTLCache(SYNC_INTERVAL, maxsize=1000)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _known_ids(self, puuid: str) -> set:
+        rows = self._conn.execute("SELECT match_id FROM player_matches WHERE puuid = ?", (puuid,))
+        return {row[0] for row in rows}
+
+    def _insert(self, rows: list):
+        self._conn.executemany(
+            f"INSERT OR IGNORE INTO player_matches ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            rows
+        )
+        self._conn.commit()
+
+    def _load(self, puuid: str, mode: str = None) -> list:
+        query = "SELECT * FROM player_matches WHERE puuid = ?"
+        params = [puuid]
+        if mode:
+            query += " AND lower(mode) = ?"
+            params.append(mode.lower())
+        return self._conn.execute(query + " ORDER BY started_at", params).fetchall()
+
+    async def sync(self, henrik, account: dict, name: str, tag: str) -> int:
+        """Pull matches we haven't stored yet for a player; returns how many were added"""
+        puuid = account['puuid']
+        if self._synced.get(puuid):
+            return 0
+        region = account.get('region', 'eu').lower()
+        known = await self._run(self._known_ids, puuid)
+
+        new_rows = []
+        for page in range(1, SYNC_MAX_PAGES + 1):
+            matches = await henrik.get_stored_matches(region, name, tag, page=page, size=SYNC_PAGE_SIZE)
+            reached_known = False
+            for match in matches:
+                # Pages are newest first, so the first known match means
+                # everything after it is already stored
+                if match['meta']['id'] in known:
+                    reached_known = True
+                    break
+                row = _match_row(puuid, match)
+                if row:
+                    new_rows.append(row)
+            if reached_known or len(matches) < SYNC_PAGE_SIZE:
+                break
+
+        if new_rows:
+            await self._run(self._insert, new_rows)
+        self._synced.set(puuid, True)
+        return len(new_rows)
+
+    async def career_stats(self, puuid: str, mode: str = None) -> dict:
+        rows = await self._run(self._load, puuid, mode)
+        return compute_career_stats(rows)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._conn.close()
+
+
+def _match_row(puuid: str, match: dict):
+    """Flatten one stored-match entry into a player_matches row"""
+    try:
+        meta = match['meta']
+        stats = match['stats']
+        teams = match.get('teams', {})
+        team = (stats.get('team') or '').lower()
+        other = 'blue' if team == 'red' else 'red'
+        shots = stats.get('shots', {})
+        return (
+            puuid,
+            meta['id'],
+            meta.get('started_at', ''),
+            (meta.get('map') or {}).get('name', 'Unknown'),
+            meta.get('mode', 'Unknown'),
+            (stats.get('character') or {}).get('name', 'Unknown'),
+            stats.get('kills', 0),
+            stats.get('deaths', 0),
+            stats.get('assists', 0),
+            shots.get('head', 0),
+            shots.get('body', 0),
+            shots.get('leg', 0),
+            stats.get('score', 0),
+            (teams.get('red') or 0) + (teams.get('blue') or 0),
+            int((teams.get(team) or 0) > (teams.get(other) or 0))
+        )
+    except (KeyError, TypeError) as e:
+        print(f"Skipping malformed stored match: {e}")
+        return None
+
+
+def _ratio(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator, dtype=float), where=denominator > 0)
+
+
+def _group(labels, kills, deaths, head, shots, score, rounds, won) -> list:
+    """Aggregate per label (agent or map), most played first"""
+    names, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    sums = lambda values: np.bincount(inverse, weights=values, minlength=len(names))
+    team = rounds > 0
+    kd = _ratio(sums(kills), sums(deaths))
+    hs = _ratio(sums(head), sums(shots)) * 100
+    acs = _ratio(sums(score * team), sums(rounds))
+    decided = sums(team.astype(float))
+    win_rate = _ratio(sums(won), decided) * 100
+    order = np.argsort(-counts, kind="stable")
+    return [
+        {
+            "name": str(names[i]),
+            "matches": int(counts[i]),
+            "kd": float(kd[i]),
+            "hs": float(hs[i]),
+            "acs": float(acs[i]),
+            "decided": int(decided[i]),
+            "win_rate": float(win_rate[i])
+        }
+        for i in order
+    ]
+
+
+def compute_career_stats(rows: list) -> dict:
+    """Career aggregates over player_matches rows ordered oldest first"""
+    if not rows:
+        return {"matches": 0}
+
+    columns = list(zip(*rows))
+    col = lambda name: columns[COLUMNS.index(name)]
+    kills = np.array(col("kills"), dtype=float)
+    deaths = np.array(col("deaths"), dtype=float)
+    head = np.array(col("head"), dtype=float)
+    shots = head + np.array(col("body"), dtype=float) + np.array(col("leg"), dtype=float)
+    score = np.array(col("score"), dtype=float)
+    rounds = np.array(col("rounds"), dtype=float)
+    won = np.array(col("won"), dtype=float)
+    agents = np.array(col("agent"))
+    maps = np.array(col("map"))
+
+    # Rolling K/D over the last ROLLING_WINDOW matches, via cumulative sums
+    window = min(ROLLING_WINDOW, len(kills))
+    kill_sums = np.cumsum(kills)
+    death_sums = np.cumsum(deaths)
+    rolling_kills = kill_sums[window - 1:] - np.concatenate(([0.0], kill_sums[:-window]))
+    rolling_deaths = death_sums[window - 1:] - np.concatenate(([0.0], death_sums[:-window]))
+    rolling_kd = _ratio(rolling_kills, rolling_deaths)
+
+    total_shots = shots.sum()
+    total_rounds = rounds.sum()
+    # Team-less modes (deathmatch) have no team score and so no rounds;
+    # they're neither wins nor losses, and their score has no rounds to
+    # average over
+    team = rounds > 0
+    decided = int(team.sum())
+    wins = int(won.sum())
+    return {
+        "matches": len(kills),
+        "wins": wins,
+        "losses": decided - wins,
+        "win_rate": wins / decided * 100 if decided else 0.0,
+        "kd": float(kills.sum() / max(deaths.sum(), 1)),
+        "hs": float(head.sum() / total_shots * 100) if total_shots else 0.0,
+        "acs": float(score[team].sum() / total_rounds) if total_rounds else 0.0,
+        "rolling_window": window,
+        "rolling_kd": rolling_kd.tolist(),
+        "agents": _group(agents, kills, deaths, head, shots, score, rounds, won),
+        "maps": _group(maps, kills, deaths, head, shots, score, rounds, won)
+    }
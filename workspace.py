@@ -0,0 +1,88 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager
+
+# Scratch space for media and document jobs. The directory belongs to this
+# bot: anything left in it at startup is from a crashed run.
+WORKSPACE_ROOT = os.getenv("WORKSPACE_ROOT", os.path.join(tempfile.gettempdir(), "privatebot-jobs"))
+WORKSPACE_QUOTA_BYTES = int(os.getenv("WORKSPACE_QUOTA_BYTES", 4 * 1024 ** 3))
+# How long a job may wait for space before it's turned away
+ADMISSION_TIMEOUT = 30  # seconds
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class Workspace:
+    """A job's private scratch directory"""
+
+    def __init__(self, path: str, reserved: int):
+        self.path = path
+        self.reserved = reserved
+
+    def file(self, name: str) -> str:
+        """Path for a file inside the workspace; only the base name of ``name`` is used"""
+        return os.path.join(self.path, os.path.basename(name) or "file")
+
+
+class WorkspaceManager:
+    """Hands out per-job temp directories under a global disk quota.
+
+    Each job reserves its expected peak disk use up front. A job that
+    doesn't fit waits up to ADMISSION_TIMEOUT for others to finish, then
+    gets QuotaExceeded. The directory is removed when the job ends,
+    however it ends.
+    """
+
+    def __init__(self, root: str = WORKSPACE_ROOT, quota: int = WORKSPACE_QUOTA_BYTES):
+        self.root = root
+        self.quota = quota
+        self.reserved = 0
+        self.active = 0
+        self._released = asyncio.Condition()
+
+    def cleanup_stale(self) -> int:
+        """Remove workspaces left behind by a previous run; returns how many"""
+        os.makedirs(self.root, exist_ok=True)
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def _fits(self, size: int) -> bool:
+        if self.reserved + size > self.quota:
+            return False
+        return shutil.disk_usage(self.root).free > size
+
+    @asynccontextmanager
+    async def workspace(self, prefix: str, reserve_bytes: int = 0):
+        # A single job bigger than the quota may still run on its own
+        size = min(reserve_bytes, self.quota)
+        os.makedirs(self.root, exist_ok=True)
+        async with self._released:
+            try:
+                await asyncio.wait_for(self._released.wait_for(lambda: self._fits(size)), ADMISSION_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise QuotaExceeded(f"No room for a {size / 1024 ** 2:.0f}MB job")
+            self.reserved += size
+            self.active += 1
+
+        try:
+            path = tempfile.mkdtemp(prefix=f"{prefix}-", dir=self.root)
+            try:
+                yield Workspace(path, size)
+            finally:
+                await asyncio.to_thread(shutil.rmtree, path, True)
+        finally:
+            async with self._released:
+                self.reserved -= size
+                self.active -= 1
+                self._released.notify_all()
+
+    def stats(self) -> dict:
+        return {"active": self.active, "reserved": self.reserved, "quota": self.quota}